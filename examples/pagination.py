@@ -1,5 +1,5 @@
 from prefect import flow
-from prefect_meemoo.triplydb import run_sparql
+from prefect_meemoo.triplydb import iter_sparql_select
 import os
 
 endpoint = os.environ["ENDPOINT"]
@@ -16,8 +16,8 @@ WHERE {
 
 @flow
 def main():
-    results = run_sparql(endpoint, query, "triplydb-prd", 20_100, 1)
-    print(len(list(results)))
+    results = iter_sparql_select(endpoint, query, "triplydb-prd", 20_100, 1)
+    print(sum(1 for _ in results))
 
 
 if __name__ == "__main__":
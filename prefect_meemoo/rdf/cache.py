@@ -0,0 +1,50 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class LRUCache:
+    """
+    Thread-safe cache that keeps the `maxsize` most recently used items
+    and counts its hits and misses.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, create: Callable[[], Any]) -> Any:
+        """
+        Get the item with the given key, or create and cache it when it is missing.
+        """
+        with self._lock:
+            if key in self._items:
+                self.hits += 1
+                self._items.move_to_end(key)
+                return self._items[key]
+            self.misses += 1
+
+        # Create outside of the lock, so slow reads don't block other threads
+        value = create()
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def clear(self):
+        """
+        Remove all items and reset the counters.
+        """
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,428 @@
+import gzip
+import threading
+import zlib
+from typing import BinaryIO, Iterable, Iterator, Tuple, Union
+
+import requests
+from pyoxigraph import Triple, parse
+from requests.adapters import HTTPAdapter
+from requests.auth import AuthBase
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 60.0
+CHUNK_SIZE = 1024 * 1024
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+# Status codes with which a store refuses a request before processing its body
+REFUSED_STATUS_CODES = [429, 503]
+
+# Data that can be sent to a Graph Store: serialized RDF, a file opened in binary mode
+# or an iterable of chunks, which is sent with chunked transfer encoding
+Data = Union[str, bytes, BinaryIO, Iterable[Union[str, bytes]]]
+
+# Client shared by the Graph Store tasks when no client is passed
+_lock = threading.Lock()
+_default_client = None
+
+
+class GraphStoreClient:
+    """
+    Client for SPARQL 1.1 Graph Store HTTP Protocol endpoints.
+
+    All requests of a client share a pool of keep-alive connections and are retried
+    with an exponential backoff on connection errors and status codes 429 and 5xx.
+    POST requests aren't idempotent for data with blank nodes, so they are only retried
+    on connection errors and on status codes 429 and 503, with which the store refused
+    the request, and not after read errors or timeouts.
+    Timeouts are split in a connect and a read timeout, so slow writes of large graphs
+    don't fail while unreachable stores are detected quickly.
+
+    Files and iterables of chunks are streamed instead of read into memory, and graphs
+    can be downloaded to a file or iterated as chunks or triples while they arrive.
+    Since they can't be sent twice, only the requests with a file that can be rewound
+    are retried. Use `post_split` to load large N-Triples files in requests of bounded size.
+
+    Example:
+        Load many named graphs over the same connections:
+        ```python
+        from prefect_meemoo.rdf.gsp import GraphStoreClient
+        with GraphStoreClient(read_timeout=300, gzip=True) as client:
+            for graph, data in graphs.items():
+                client.put("http://localhost:7878/store", data, graph, "application/n-triples")
+        ```
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        read_timeout: float = READ_TIMEOUT,
+        retries: int = 5,
+        backoff_factor: float = 1,
+        gzip: bool = False,
+        pool_size: int = 10,
+    ):
+        """
+        Parameters:
+            - connect_timeout (float, optional): Seconds to wait for a connection. Defaults to 3.05.
+            - read_timeout (float, optional): Seconds to wait for the response. Defaults to 60.
+            - retries (int, optional): Maximum number of retries per request. Defaults to 5.
+            - backoff_factor (float, optional): Backoff factor between retries. Defaults to 1.
+            - gzip (bool, optional): Compress request bodies with gzip. Defaults to False.
+            - pool_size (int, optional): Number of connections kept per host. Defaults to 10.
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.gzip = gzip
+        retry = _GraphStoreRetry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            # POST is left out, see _GraphStoreRetry
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        self.session = _create_session(pool_size, retry)
+        # Streamed chunks are consumed by the first attempt and can't be retried
+        self.stream_session = _create_session(pool_size, 0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.session.close()
+        self.stream_session.close()
+
+    def post(
+        self,
+        endpoint: str,
+        data: Data,
+        graph: str = None,
+        content_type: str = "text/turtle",
+        auth: AuthBase = None,
+        timeout: Union[float, Tuple[float, float]] = None,
+    ) -> bool:
+        """
+        Add RDF data to a graph.
+        If `graph` is None, the `endpoint` is assumed to use Direct Graph Identification.
+
+        Returns:
+            - True if the POST was successful
+        """
+        self._send("POST", endpoint, graph, content_type, data, auth, timeout)
+        return True
+
+    def put(
+        self,
+        endpoint: str,
+        data: Data,
+        graph: str = None,
+        content_type: str = "text/turtle",
+        auth: AuthBase = None,
+        timeout: Union[float, Tuple[float, float]] = None,
+    ) -> bool:
+        """
+        Replace a graph with RDF data.
+        If `graph` is None, the `endpoint` is assumed to use Direct Graph Identification.
+
+        Returns:
+            - True if the PUT was successful
+        """
+        self._send("PUT", endpoint, graph, content_type, data, auth, timeout)
+        return True
+
+    def delete(
+        self,
+        endpoint: str,
+        graph: str = None,
+        auth: AuthBase = None,
+        timeout: Union[float, Tuple[float, float]] = None,
+    ) -> bool:
+        """
+        Delete a graph.
+        If `graph` is None, the `endpoint` is assumed to use Direct Graph Identification.
+
+        Returns:
+            - True if the DELETE was successful
+        """
+        self._request("DELETE", endpoint, graph, auth=auth, timeout=timeout)
+        return True
+
+    def get(
+        self,
+        endpoint: str,
+        graph: str = None,
+        content_type: str = "text/turtle",
+        auth: AuthBase = None,
+        timeout: Union[float, Tuple[float, float]] = None,
+    ) -> str:
+        """
+        Get the serialization of a graph in the requested `content_type`.
+        If `graph` is None, the `endpoint` is assumed to use Direct Graph Identification.
+
+        Returns:
+            - The serialized graph
+        """
+        response = self._request(
+            "GET",
+            endpoint,
+            graph,
+            headers={"Accept": content_type},
+            auth=auth,
+            timeout=timeout,
+        )
+        return response.text
+
+    def download(
+        self,
+        endpoint: str,
+        path: str,
+        graph: str = None,
+        content_type: str = "application/n-triples",
+        auth: AuthBase = None,
+        timeout: Union[float, Tuple[float, float]] = None,
+    ) -> Tuple[int, int]:
+        """
+        Stream the serialization of a graph to a file without holding it in memory.
+
+        Returns:
+            - The number of bytes and the number of lines written, which is the
+              number of triples for N-Triples
+        """
+        size = 0
+        lines = 0
+        with open(path, "wb") as f:
+            for chunk in self.iter_chunks(endpoint, graph, content_type, auth, timeout):
+                f.write(chunk)
+                size += len(chunk)
+                lines += chunk.count(b"\n")
+        return size, lines
+
+    def iter_chunks(
+        self,
+        endpoint: str,
+        graph: str = None,
+        content_type: str = "application/n-triples",
+        auth: AuthBase = None,
+        timeout: Union[float, Tuple[float, float]] = None,
+    ) -> Iterator[bytes]:
+        """
+        Get the serialization of a graph in chunks while it arrives.
+
+        Returns:
+            - Generator of decompressed chunks of the serialized graph
+        """
+        with self._get_stream(endpoint, graph, content_type, auth, timeout) as response:
+            yield from response.iter_content(CHUNK_SIZE)
+
+    def iter_triples(
+        self,
+        endpoint: str,
+        graph: str = None,
+        content_type: str = "application/n-triples",
+        auth: AuthBase = None,
+        timeout: Union[float, Tuple[float, float]] = None,
+    ) -> Iterator[Triple]:
+        """
+        Parse the triples of a graph while they arrive.
+
+        Returns:
+            - Generator of pyoxigraph triples
+        """
+        with self._get_stream(endpoint, graph, content_type, auth, timeout) as response:
+            response.raw.decode_content = True
+            yield from parse(response.raw, content_type)
+
+    def post_split(
+        self,
+        endpoint: str,
+        file: BinaryIO,
+        max_bytes: int,
+        graph: str = None,
+        content_type: str = "application/n-triples",
+        auth: AuthBase = None,
+        timeout: Union[float, Tuple[float, float]] = None,
+        replace: bool = False,
+    ) -> int:
+        """
+        Add a line based RDF file, such as N-Triples, to a graph in requests of at most
+        `max_bytes` bytes. The file is split on line boundaries, see `split_ntriples`.
+        When `replace` is set, the first request is a PUT, so the graph is replaced.
+
+        Files with blank nodes are rejected, since every request is a separate document.
+        Seekable files are checked before the first request is sent.
+
+        Returns:
+            - The number of requests that were sent
+        """
+        if getattr(file, "seekable", lambda: False)():
+            position = file.tell()
+            for line in file:
+                _check_blank_node(line)
+            file.seek(position)
+
+        count = 0
+        for chunk in split_ntriples(file, max_bytes):
+            method = "PUT" if replace and count == 0 else "POST"
+            self._send(method, endpoint, graph, content_type, chunk, auth, timeout)
+            count += 1
+        if replace and count == 0:
+            self._send("PUT", endpoint, graph, content_type, b"", auth, timeout)
+            count += 1
+        return count
+
+    def _get_stream(self, endpoint, graph, content_type, auth, timeout):
+        return self._request(
+            "GET",
+            endpoint,
+            graph,
+            headers={"Accept": content_type},
+            auth=auth,
+            timeout=timeout,
+            stream=True,
+        )
+
+    def _send(self, method, endpoint, graph, content_type, data, auth, timeout):
+        headers = {"Content-Type": content_type}
+        session = self.session
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if isinstance(data, bytes):
+            if self.gzip:
+                data = gzip.compress(data)
+        else:
+            if hasattr(data, "read"):
+                if self.gzip or not getattr(data, "seekable", lambda: False)():
+                    data = _read_chunks(data)
+            else:
+                data = _encode_chunks(data)
+            if self.gzip:
+                data = _gzip_chunks(data)
+            if not hasattr(data, "read"):
+                session = self.stream_session
+        if self.gzip:
+            headers["Content-Encoding"] = "gzip"
+        return self._request(
+            method,
+            endpoint,
+            graph,
+            headers=headers,
+            data=data,
+            auth=auth,
+            timeout=timeout,
+            session=session,
+        )
+
+    def _request(self, method, endpoint, graph, timeout=None, session=None, **kwargs):
+        response = (session or self.session).request(
+            method,
+            endpoint,
+            params={"graph": graph} if graph is not None else None,
+            timeout=timeout or self.timeout,
+            **kwargs,
+        )
+        if response.status_code >= 400:
+            graph_endpoint = f"{endpoint}?graph={graph}" if graph is not None else endpoint
+            raise Exception(f"{method} request to {graph_endpoint} failed: {response.status_code}")
+        return response
+
+
+class _GraphStoreRetry(Retry):
+    """
+    Retry that also retries POST requests the store refused without processing them.
+
+    A POST that failed after the store read it may have been committed, and posting
+    data with blank nodes again would duplicate them. Since POST is not an allowed
+    method, urllib3 only retries it on connection errors, before anything was sent.
+    """
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if method == "POST":
+            return bool(self.total) and status_code in REFUSED_STATUS_CODES
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def get_default_client() -> GraphStoreClient:
+    """
+    Get the client shared by all Graph Store tasks in this process that were not given a client.
+    """
+    global _default_client
+    with _lock:
+        if _default_client is None:
+            _default_client = GraphStoreClient()
+        return _default_client
+
+
+def split_ntriples(file: BinaryIO, max_bytes: int) -> Iterator[bytes]:
+    """
+    Split a line based RDF file, such as N-Triples, in chunks of at most `max_bytes` bytes.
+
+    Chunks only end on line boundaries, so every chunk can be parsed on its own.
+    A single line longer than `max_bytes` is returned as a chunk of its own.
+
+    Blank node labels are scoped to a document, so a blank node with triples in two
+    chunks would become two different nodes once the chunks are loaded separately.
+    Only files without blank nodes can be split: a ValueError is raised at the first
+    line with a blank node, after the chunks before it were returned.
+
+    Returns:
+        - Generator of chunks
+    """
+    lines = []
+    size = 0
+    for line in file:
+        _check_blank_node(line)
+        if lines and size + len(line) > max_bytes:
+            yield b"".join(lines)
+            lines, size = [], 0
+        lines.append(line)
+        size += len(line)
+    if lines:
+        yield b"".join(lines)
+
+
+def _check_blank_node(line: bytes):
+    """
+    Raise a ValueError if an N-Triples line has a blank node as subject or object.
+    """
+    if line.startswith(b"_:"):
+        raise ValueError(f"Can't split RDF with blank nodes: {line[:200]!r}")
+    # IRIs can't contain ">", so the object follows the second ">" of the line
+    end = line.find(b">", line.find(b">") + 1)
+    if end != -1 and line[end + 1 :].lstrip().startswith(b"_:"):
+        raise ValueError(f"Can't split RDF with blank nodes: {line[:200]!r}")
+
+
+def _create_session(pool_size: int, retry: Union[Retry, int]) -> requests.Session:
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return session
+
+
+def _read_chunks(file: BinaryIO) -> Iterator[bytes]:
+    while True:
+        chunk = file.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _encode_chunks(chunks: Iterable[Union[str, bytes]]) -> Iterator[bytes]:
+    for chunk in chunks:
+        yield chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+
+
+def _gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
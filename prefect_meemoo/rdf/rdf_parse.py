@@ -1,53 +1,202 @@
-from collections import deque
+import hashlib
+import json
+from functools import lru_cache
+from typing import BinaryIO, Iterable, TextIO, Union
+from urllib.parse import quote
 
 import ijson
 from rdflib import BNode, Literal, Namespace
+from rdflib.plugins.serializers.nt import _quoteLiteral
+
+# Events of ijson.basic_parse
+START_MAP, END_MAP, MAP_KEY = "start_map", "end_map", "map_key"
+START_ARRAY, END_ARRAY = "start_array", "end_array"
+STRING, NULL = "string", "null"
+LITERAL_EVENTS = frozenset(["boolean", "integer", "double", "number"])
+
+# Number of distinct predicates and literals that are reused between triples,
+# since most keys and many values occur in every record
+PREDICATE_CACHE_SIZE = 4096
+LITERAL_CACHE_SIZE = 65536
+
+# Events of python values, in the order their types are checked
+_VALUE_EVENTS = [(str, STRING), (bool, "boolean"), (int, "integer"), (float, "double")]
+
+# ijson backends from fastest to slowest; the yajl backends need a compiled
+# extension or the YAJL library, the python backend is always available
+BACKENDS = ["yajl2_c", "yajl2_cffi", "yajl2", "python"]
+
+
+def load_backend(names: Iterable[str] = BACKENDS):
+    """
+    Load the first ijson backend of `names` that is available in this environment.
+    """
+    for name in names:
+        try:
+            return ijson.get_backend(name)
+        except ImportError:
+            continue
+    raise ImportError(f"None of the ijson backends {list(names)} is available.")
+
+
+# Backend used by parse_json, selected once when the module is imported
+BACKEND = load_backend()
+
+
+def get_backend_name() -> str:
+    """Get the name of the ijson backend used by `parse_json`, such as "yajl2_c"."""
+    return BACKEND.backend
 
 
 def parse_dict(data, **kwargs):
     """Generates RDFlib triples from a python dictionary using a direct mapping."""
 
-    def basic_parse(data):
-        if isinstance(data, dict):  # start_map
-            yield "start_map", None
-            for k, v in data.items():
-                yield "map_key", k
-                for event, value in basic_parse(v):
-                    yield event, value
-            yield "end_map", None
-        elif isinstance(data, list):  # start_list
-            yield "start_array", None
-            for i in data:
-                for event, value in basic_parse(i):
-                    yield event, value
-            yield "end_array", None
-        elif data is None:
-            yield "null", data
-        elif isinstance(data, str):
-            yield "string", data
-        elif isinstance(data, bool):
-            yield "boolean", data
-        elif isinstance(data, int):
-            yield "integer", data
-        elif isinstance(data, float):
-            yield "double", data
-
-    events = basic_parse(data)
+    events = _dict_events(data)
     return _parse_events(events, **kwargs)
 
 
-def parse_json(json, **kwargs):
+def parse_json(json: Union[str, bytes, BinaryIO], backend=None, **kwargs):
     """
-    Generates RDFlib triples from a file-like object
-    or a string using a direct mapping.
+    Generates RDFlib triples from a file-like object,
+    bytes or a string using a direct mapping.
+
+    The JSON is parsed by the fastest available ijson backend, see `get_backend_name`,
+    or by the given `backend` name or module. Bytes and files opened in binary mode are
+    parsed without decoding them first; strings are encoded to UTF-8 once.
     """
+    if backend is None:
+        backend = BACKEND
+    elif isinstance(backend, str):
+        backend = ijson.get_backend(backend)
+
+    if isinstance(json, str):
+        json = json.encode("utf-8")
 
     #   parse json
-    events = ijson.basic_parse(json, use_float=True)
+    events = backend.basic_parse(json, use_float=True)
 
     return _parse_events(events, **kwargs)
 
 
+def parse_jsonl(file: Union[BinaryIO, TextIO, Iterable], id_key: str = None, **kwargs):
+    """
+    Generates RDFlib triples from newline-delimited JSON (JSON Lines) using a direct mapping.
+
+    The records are read and mapped one line at a time, so the file is never
+    loaded into memory. When an `instance_ns` is given, the objects of every record
+    get IRIs in the namespace of that record, built from the value of its `id_key`
+    or from its hash, see `document_namespace`.
+    """
+    instance_ns = kwargs.pop("instance_ns", None)
+    for line in file:
+        if not line.strip():
+            continue
+        if isinstance(instance_ns, Namespace):
+            kwargs["instance_ns"] = document_namespace(instance_ns, line, id_key)
+        yield from parse_json(line, **kwargs)
+
+
+def document_namespace(
+    instance_ns: Namespace, data: Union[str, bytes, dict], id_key: str = None
+) -> Namespace:
+    """
+    Get the namespace for the IRIs of the objects in a single JSON document or dict.
+
+    The namespace doesn't depend on the position of the document in its input, so the
+    output of separate conversions with the same `instance_ns` can be merged.
+    With an `id_key`, it is `{instance_ns}{id}/` with the URL encoded value of that key,
+    where nested keys are separated by dots, like "Dynamic.PID".
+    Otherwise it is `{instance_ns}{hash}/` with the SHA-1 hash of the compact JSON
+    serialization of the document with sorted keys, so a record gets the same IRIs
+    whether it is given as a dict or as JSON, regardless of whitespace and key order.
+    """
+    if id_key is None:
+        if not isinstance(data, dict):
+            data = json.loads(data)
+        canonical = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return Namespace(f"{instance_ns}{hashlib.sha1(canonical.encode('utf-8')).hexdigest()}/")
+
+    if isinstance(data, dict):
+        value = data
+        for key in id_key.split("."):
+            value = value.get(key) if isinstance(value, dict) else None
+    else:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        value = next(BACKEND.items(data, id_key), None)
+    if value is None or isinstance(value, (dict, list)):
+        raise ValueError(f"Document has no value for id key {id_key}: {data!r:.200}")
+    return Namespace(f"{instance_ns}{quote(str(value), safe='')}/")
+
+
+def serialize_triples(triples: Iterable[tuple], file: TextIO, dedup: bool = False) -> int:
+    """
+    Writes RDFlib triples as N-Triples lines to a text file while they are generated,
+    without adding them to a graph first.
+    When `dedup` is set, lines that were written before are skipped,
+    which keeps every written line in memory.
+
+    Returns the number of written triples.
+    """
+    seen = set() if dedup else None
+    count = 0
+    subject = subject_nt = None
+    for s, p, o in triples:
+        # consecutive triples mostly share their subject
+        if s is not subject:
+            subject, subject_nt = s, s.n3()
+        line = f"{subject_nt} {_predicate_nt(p)} {_object_nt(o)} .\n"
+        if seen is not None:
+            if line in seen:
+                continue
+            seen.add(line)
+        file.write(line)
+        count += 1
+    return count
+
+
+def _dict_events(data):
+    """
+    Internal method that yields the same event, value pairs as `ijson.basic_parse`
+    for a python value, walking nested values with a stack instead of recursion.
+    """
+    done = object()
+    # iterators over the containers being walked, with their end event
+    stack = []
+    value = data
+    while True:
+        if isinstance(value, dict):
+            yield START_MAP, None
+            stack.append((iter(value.items()), END_MAP))
+        elif isinstance(value, list):
+            yield START_ARRAY, None
+            stack.append((iter(value), END_ARRAY))
+        elif value is None:
+            yield NULL, None
+        else:
+            for value_type, event in _VALUE_EVENTS:
+                if isinstance(value, value_type):
+                    yield event, value
+                    break
+
+        # find the next value
+        while stack:
+            items, end = stack[-1]
+            item = next(items, done)
+            if item is done:
+                stack.pop()
+                yield end, None
+            elif end is END_MAP:
+                yield MAP_KEY, item[0]
+                value = item[1]
+                break
+            else:
+                value = item
+                break
+        else:
+            return
+
+
 def _parse_events(events, **kwargs):
     """
     Internal method that generates RDFlib triples
@@ -64,24 +213,28 @@ def _parse_events(events, **kwargs):
     if "instance_ns" in kwargs and isinstance(kwargs["instance_ns"], Namespace):
         instance_ns = kwargs["instance_ns"]
 
-    # initializing deque
-    subject_stack = deque([])
+    subject_stack = []
     array_properties = {}
     prop = None
 
     i = 0
+    # The events are checked from most to least frequent
     for event, value in events:
-        if event == "start_array" and subject_stack and prop is not None:
-            # fetching the last subject
-            s = subject_stack[-1]
-            array_properties[s] = prop
+        if event == STRING:
+            if prop is not None:
+                yield (subject_stack[-1], prop, _literal(str, value))
+
+        elif event == MAP_KEY:
+            prop = _predicate(namespace, value)
 
-        if event == "end_array" and subject_stack:
-            # fetching the last subject
-            s = subject_stack[-1]
-            array_properties.pop(s, None)
+        elif event in LITERAL_EVENTS:
+            # 0.0 and -0.0 are equal, so floats are not cached
+            if type(value) is float:
+                yield (subject_stack[-1], prop, Literal(value))
+            else:
+                yield (subject_stack[-1], prop, _literal(type(value), value))
 
-        if event == "start_map":
+        elif event == START_MAP:
             if instance_ns is not None:
                 subject = instance_ns[str(i)]
                 i += 1
@@ -89,24 +242,45 @@ def _parse_events(events, **kwargs):
                 subject = BNode()
             # add triple with current array property, if any
             if prop is not None and subject_stack:
-                # fetching the last subject
-                s = subject_stack[-1]
-                yield (s, prop, subject)
+                yield (subject_stack[-1], prop, subject)
             subject_stack.append(subject)
 
-        if event == "end_map":
+        elif event == END_MAP:
             subject_stack.pop()
 
             # restore previous array property, if there was any
             if subject_stack and subject_stack[-1] in array_properties:
                 prop = array_properties[subject_stack[-1]]
 
-        if event in ["boolean", "integer", "double", "number"]:
-            yield (subject_stack[-1], prop, Literal(value))
+        elif event == START_ARRAY:
+            if subject_stack and prop is not None:
+                array_properties[subject_stack[-1]] = prop
+
+        elif event == END_ARRAY:
+            if subject_stack:
+                array_properties.pop(subject_stack[-1], None)
+
+
+@lru_cache(maxsize=PREDICATE_CACHE_SIZE)
+def _predicate(namespace, key):
+    return namespace[key]
+
+
+# 1 and True are equal, so the type is part of the cache key
+@lru_cache(maxsize=LITERAL_CACHE_SIZE)
+def _literal(value_type, value):
+    return Literal(value)
+
+
+@lru_cache(maxsize=PREDICATE_CACHE_SIZE)
+def _predicate_nt(predicate):
+    return predicate.n3()
+
+
+def _object_nt(o):
+    return _literal_nt(o) if isinstance(o, Literal) else o.n3()
 
-        if event == "string" and prop is not None:
-            yield (subject_stack[-1], prop, Literal(value))
-            # yield (subjectStack[-1], property, Literal(value, datatype=XSD.string))
 
-        if event == "map_key":
-            prop = namespace[value]
+@lru_cache(maxsize=LITERAL_CACHE_SIZE)
+def _literal_nt(literal):
+    return _quoteLiteral(literal)
@@ -0,0 +1,273 @@
+import re
+from datetime import date, datetime
+from itertools import islice
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Set, Tuple
+
+import ijson
+import pandas as pd
+
+"""
+--- Streaming parsers for SPARQL SELECT results ---
+"""
+
+FORMATS = {
+    "json": "application/sparql-results+json",
+    "tsv": "text/tab-separated-values",
+}
+
+XSD = "http://www.w3.org/2001/XMLSchema#"
+INTEGER_TYPES = {
+    XSD + t
+    for t in [
+        "integer",
+        "int",
+        "long",
+        "short",
+        "byte",
+        "nonNegativeInteger",
+        "nonPositiveInteger",
+        "positiveInteger",
+        "negativeInteger",
+        "unsignedLong",
+        "unsignedInt",
+        "unsignedShort",
+        "unsignedByte",
+    ]
+}
+FLOAT_TYPES = {XSD + "decimal", XSD + "double", XSD + "float"}
+
+# Kinds of values a column can hold, used to pick its dtype
+IRI, BNODE, INTEGER, FLOAT, BOOLEAN, DATETIME, STRING = (
+    "iri",
+    "bnode",
+    "integer",
+    "float",
+    "boolean",
+    "datetime",
+    "string",
+)
+
+_ESCAPES = {"t": "\t", "b": "\b", "n": "\n", "r": "\r", "f": "\f", '"': '"', "'": "'", "\\": "\\"}
+_ESCAPE = re.compile(r"\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))")
+_LITERAL = re.compile(r'^"(.*)"(?:@([^"]+)|\^\^<([^>]*)>)?$', re.S)
+_INTEGER = re.compile(r"^[+-]?\d+$")
+# xsd:dateTime and xsd:date, of which datetime.fromisoformat only reads a subset
+# before Python 3.11: no "Z" timezone and only 3 or 6 fractional digits
+_DATETIME = re.compile(
+    r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d+))?(Z|[+-]\d{2}:\d{2})?$"
+)
+_DATE = re.compile(r"^(\d{4}-\d{2}-\d{2})(?:Z|[+-]\d{2}:\d{2})?$")
+
+
+def iter_result_batches(
+    stream: BinaryIO,
+    format: str = "json",
+    batch_size: int = 10000,
+    kinds: Dict[str, Set[str]] = None,
+) -> Tuple[List[str], Iterator[List[dict]]]:
+    """
+    Parse SPARQL SELECT results while they are read from a binary stream.
+
+    Values are converted to Python types according to their datatype: integers,
+    floats, booleans and datetimes. IRIs, blank nodes and other literals are strings.
+    Unbound variables are missing from the rows.
+
+    Parameters:
+        - stream (BinaryIO): the response with the results
+        - format (str): "json" for SPARQL JSON results or "tsv" for SPARQL TSV results
+        - batch_size (int): the number of rows per batch
+        - kinds (dict, optional): updated with the kinds of values found per variable
+
+    Returns:
+        - The variables and a generator of row batches
+    """
+    if format == "json":
+        variables, rows = _parse_json(stream)
+    elif format == "tsv":
+        variables, rows = _parse_tsv(stream)
+    else:
+        raise ValueError(f"Unsupported result format {format}, expected one of {list(FORMATS)}")
+
+    if kinds is not None:
+        rows = _record_kinds(rows, kinds)
+
+    def batches():
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield [{k: v for k, (v, _) in row.items()} for row in batch]
+
+    return variables, batches()
+
+
+def to_dataframe(
+    variables: List[str], batches: Iterable[List[dict]], kinds: Dict[str, Set[str]]
+) -> pd.DataFrame:
+    """
+    Build a DataFrame from row batches, one chunk per batch.
+
+    Columns that only hold IRIs become categoricals, integer columns with
+    unbound values use the nullable `Int64` dtype and datetimes become `datetime64`.
+    """
+    chunks = [pd.DataFrame.from_records(batch, columns=variables) for batch in batches]
+    if not chunks:
+        return pd.DataFrame(columns=variables)
+    df = pd.concat(chunks, ignore_index=True, copy=False)
+
+    for column in variables:
+        column_kinds = kinds.get(column, set())
+        if column_kinds == {IRI}:
+            df[column] = df[column].astype("category")
+        elif column_kinds == {INTEGER}:
+            try:
+                df[column] = df[column].astype("Int64")
+            except (OverflowError, TypeError):
+                # xsd:integer is unbounded, so values can be out of range of int64
+                pass
+        elif column_kinds and column_kinds <= {INTEGER, FLOAT}:
+            df[column] = df[column].astype("float64")
+        elif column_kinds == {BOOLEAN}:
+            df[column] = df[column].astype("boolean")
+        elif column_kinds == {DATETIME}:
+            try:
+                df[column] = pd.to_datetime(df[column])
+            except (ValueError, TypeError):
+                # Mixed timezones can't be held in a single datetime64 column
+                pass
+    return df
+
+
+def _record_kinds(rows, kinds):
+    for row in rows:
+        for k, (_, kind) in row.items():
+            kinds.setdefault(k, set()).add(kind)
+        yield row
+
+
+def _parse_json(stream):
+    events = ijson.parse(stream, use_float=True)
+    variables = []
+    # The head precedes the results in practically every response
+    for prefix, event, value in events:
+        if prefix == "head.vars.item":
+            variables.append(value)
+        elif prefix == "results.bindings" and event == "start_array":
+            break
+    return variables, _json_rows(events)
+
+
+def _json_rows(events):
+    item = "results.bindings.item"
+    row = term = variable = None
+    for prefix, event, value in events:
+        if prefix == item:
+            if event == "start_map":
+                row = {}
+            elif event == "end_map":
+                yield row
+        elif prefix == "results.bindings":
+            # End of the bindings array
+            return
+        elif event == "start_map":
+            variable = prefix[len(item) + 1 :]
+            term = {}
+        elif event == "end_map":
+            row[variable] = _convert_json(term)
+        elif event == "string":
+            term[prefix.rpartition(".")[2]] = value
+
+
+def _convert_json(term: dict):
+    if term.get("type") == "uri":
+        return term["value"], IRI
+    if term.get("type") == "bnode":
+        return term["value"], BNODE
+    return _convert_literal(term.get("value", ""), term.get("datatype"))
+
+
+def _parse_tsv(stream):
+    lines = iter(stream)
+    header = next(lines, b"").decode("utf-8").rstrip("\r\n")
+    variables = [v.lstrip("?$") for v in header.split("\t")] if header else []
+    return variables, _tsv_rows(lines, variables)
+
+
+def _tsv_rows(lines, variables):
+    for line in lines:
+        line = line.decode("utf-8").rstrip("\r\n")
+        if not line:
+            continue
+        row = {}
+        for variable, cell in zip(variables, line.split("\t")):
+            if cell:
+                row[variable] = _convert_tsv(cell)
+        yield row
+
+
+def _convert_tsv(cell: str):
+    if cell.startswith("<") and cell.endswith(">"):
+        return cell[1:-1], IRI
+    if cell.startswith("_:"):
+        return cell[2:], BNODE
+    match = _LITERAL.match(cell)
+    if match:
+        value, lang, datatype = match.groups()
+        return _convert_literal(_unescape(value), datatype)
+    # Numbers and booleans can be written without quotes
+    if cell in ("true", "false"):
+        return cell == "true", BOOLEAN
+    if _INTEGER.match(cell):
+        return int(cell), INTEGER
+    try:
+        return float(cell), FLOAT
+    except ValueError:
+        return cell, STRING
+
+
+def _unescape(value: str) -> str:
+    if "\\" not in value:
+        return value
+    return _ESCAPE.sub(
+        lambda m: chr(int(m.group(1) or m.group(2), 16))
+        if m.group(3) is None
+        else _ESCAPES.get(m.group(3), m.group(0)),
+        value,
+    )
+
+
+def _convert_literal(value: str, datatype: str = None):
+    try:
+        if datatype in INTEGER_TYPES:
+            return int(value), INTEGER
+        if datatype in FLOAT_TYPES:
+            return float(value), FLOAT
+        if datatype == XSD + "boolean":
+            return value in ("true", "1"), BOOLEAN
+        if datatype in (XSD + "dateTime", XSD + "dateTimeStamp"):
+            return _parse_datetime(value), DATETIME
+        if datatype == XSD + "date":
+            return _parse_date(value), DATETIME
+    except ValueError:
+        pass
+    return value, STRING
+
+
+def _parse_datetime(value: str) -> datetime:
+    match = _DATETIME.match(value)
+    if match is None:
+        raise ValueError(f"Invalid xsd:dateTime {value}")
+    seconds, fraction, timezone = match.groups()
+    if fraction:
+        seconds += "." + fraction[:6].ljust(6, "0")
+    if timezone == "Z":
+        timezone = "+00:00"
+    return datetime.fromisoformat(seconds + (timezone or ""))
+
+
+def _parse_date(value: str) -> date:
+    # A date's timezone can't be held by a python date, so it is dropped
+    match = _DATE.match(value)
+    if match is None:
+        raise ValueError(f"Invalid xsd:date {value}")
+    return date.fromisoformat(match.group(1))
@@ -0,0 +1,171 @@
+import io
+import threading
+from importlib.metadata import version
+from typing import BinaryIO, Iterable, Optional, Union
+
+import pyoxigraph as ox
+from oxrdflib import OxigraphStore
+from pydantic import BaseModel
+from rdflib import Graph, URIRef
+from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
+
+NTRIPLES = "application/n-triples"
+GraphName = Union[ox.NamedNode, ox.BlankNode, ox.DefaultGraph]
+
+# Oxigraph stores opened by this process, by path or by name for in-memory stores
+_lock = threading.Lock()
+_stores = {}
+
+
+class RDFStore(BaseModel):
+    """
+    Reference to an Oxigraph store shared by the RDF tasks of a flow run.
+
+    Tasks that are given a store read from and write to it directly, so a chain of
+    transformations passes this small reference around instead of serializing and
+    parsing the triples between every task.
+    The store is kept on disk when a `path` is given, otherwise it is held in memory
+    under its `name`. Every store is opened once per process.
+    Triples are read from and written to the named `graph`, or the default graph.
+
+    Example:
+        ```python
+        from prefect_meemoo.rdf.store import RDFStore
+        store = RDFStore(path="/tmp/mapping")
+        source = json_to_rdf(data, store=store.with_graph("urn:source"))
+        result = sparql_transform(source, "mapping.sparql", output=store.with_graph("urn:result"))
+        ```
+    """
+
+    name: str = "default"
+    path: Optional[str] = None
+    graph: Optional[str] = None
+
+    def open(self) -> ox.Store:
+        """
+        Get the Oxigraph store, opening it when this process didn't do that yet.
+        """
+        key = self.path if self.path is not None else f"memory:{self.name}"
+        with _lock:
+            if key not in _stores:
+                _stores[key] = ox.Store(self.path)
+            return _stores[key]
+
+    def get_graph(self) -> Graph:
+        """
+        Get an rdflib graph over the referenced graph in the store.
+        """
+        store = _SharedOxigraphStore(self.open())
+        identifier = URIRef(self.graph) if self.graph is not None else DATASET_DEFAULT_GRAPH_ID
+        return Graph(store=store, identifier=identifier)
+
+    def with_graph(self, graph: Optional[str]) -> "RDFStore":
+        """
+        Get a reference to another graph in the same store.
+        """
+        return self.copy(update={"graph": graph})
+
+    def graph_name(self) -> GraphName:
+        """
+        Get the Oxigraph name of the referenced graph.
+        """
+        return ox.NamedNode(self.graph) if self.graph is not None else ox.DefaultGraph()
+
+    def clear(self):
+        """
+        Remove all triples from the referenced graph.
+        """
+        self.open().clear_graph(self.graph_name())
+
+    def count(self) -> int:
+        """
+        Count the triples in the referenced graph.
+        """
+        return sum(1 for _ in self.open().quads_for_pattern(None, None, None, self.graph_name()))
+
+
+class _SharedOxigraphStore(OxigraphStore):
+    """
+    oxrdflib store over an Oxigraph store that is already opened, so it is shared
+    instead of opened again, which on-disk stores don't allow.
+
+    oxrdflib 0.3 has no public way to do that, so the Oxigraph store is assigned to
+    its private `_store` attribute. Other versions are refused instead of relying on it.
+    """
+
+    def __init__(self, store: ox.Store):
+        oxrdflib_version = version("oxrdflib")
+        if not oxrdflib_version.startswith("0.3."):
+            raise RuntimeError(
+                f"Sharing an Oxigraph store requires oxrdflib 0.3, found {oxrdflib_version}"
+            )
+        super().__init__()
+        self._store = store
+
+
+def load_ntriples(
+    store: ox.Store, data: Union[str, bytes], graph_name: GraphName = None
+):
+    """
+    Load N-Triples into a graph of an Oxigraph store with its native bulk loader,
+    without creating rdflib terms for every triple. The load is not atomic.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    store.bulk_load(io.BytesIO(data), NTRIPLES, to_graph=graph_name or ox.DefaultGraph())
+
+
+def dump_ntriples(store: ox.Store, graph_name: GraphName = None) -> str:
+    """
+    Serialize a graph of an Oxigraph store to N-Triples with its native serializer.
+    """
+    output = io.BytesIO()
+    store.dump(output, NTRIPLES, from_graph=graph_name or ox.DefaultGraph())
+    return output.getvalue().decode("utf-8")
+
+
+def serialize_ntriples(triples: Iterable[ox.Triple]) -> str:
+    """
+    Serialize pyoxigraph triples, such as CONSTRUCT results, to N-Triples without
+    duplicate lines, keeping the order of the triples.
+    """
+    output = io.BytesIO()
+    ox.serialize(triples, output, NTRIPLES)
+    lines = output.getvalue().decode("utf-8").splitlines(keepends=True)
+    return "".join(dict.fromkeys(lines))
+
+
+def write_ntriples(
+    triples: Iterable[ox.Triple], destination: Union[str, BinaryIO]
+) -> int:
+    """
+    Stream pyoxigraph triples, such as CONSTRUCT results, to an N-Triples file or to a
+    file-like object opened in binary mode, while they are produced.
+    Duplicate triples are not removed.
+
+    Returns:
+        - The number of written triples
+    """
+    count = 0
+
+    def counted():
+        nonlocal count
+        for t in triples:
+            count += 1
+            yield t
+
+    if isinstance(destination, str):
+        with open(destination, "wb") as f:
+            ox.serialize(counted(), f, NTRIPLES)
+    else:
+        ox.serialize(counted(), destination, NTRIPLES)
+    return count
+
+
+def close_stores():
+    """
+    Forget all stores opened by this process, so on-disk stores can be opened by others.
+    In-memory stores are lost.
+    """
+    with _lock:
+        _stores.clear()
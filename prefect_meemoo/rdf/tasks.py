@@ -1,21 +1,72 @@
 import os.path
+import shutil
+import stat
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from io import StringIO
-from typing import Any, Dict, Optional
-
-import pandas as pd
-import requests
+from itertools import chain, islice
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+import pyoxigraph as ox
 from prefect import get_run_logger, task
-from prefect_meemoo.rdf.rdf_parse import parse_dict, parse_json
+from prefect.exceptions import MissingContextError
+from prefect.logging import get_logger
+from prefect_meemoo.rdf.cache import LRUCache
+from prefect_meemoo.rdf.gsp import GraphStoreClient, get_default_client
+from prefect_meemoo.rdf.rdf_parse import (
+    document_namespace,
+    get_backend_name,
+    parse_dict,
+    parse_json,
+    parse_jsonl,
+    serialize_triples,
+)
+from prefect_meemoo.rdf.sparql_results import FORMATS as RESULT_FORMATS
+from prefect_meemoo.rdf.sparql_results import iter_result_batches, to_dataframe
+from prefect_meemoo.rdf.store import (
+    GraphName,
+    RDFStore,
+    dump_ntriples,
+    load_ntriples,
+    serialize_ntriples,
+    write_ntriples,
+)
 from pyshacl import validate
-from rdflib import ConjunctiveGraph, Graph, Namespace, URIRef
+from rdflib import BNode, Graph, Namespace
 from rdflib.compare import graph_diff, to_isomorphic
 from requests.auth import AuthBase, HTTPBasicAuth, HTTPDigestAuth
-from SPARQLWrapper import CSV, DIGEST, GET, POST, POSTDIRECTLY, SPARQLWrapper
+from SPARQLWrapper import DIGEST, GET, JSON, POST, POSTDIRECTLY, TSV, SPARQLWrapper
 from SPARQLWrapper.Wrapper import BASIC
 
 METHODS = {"GET": GET, "POST": POST}
 SRC_NS = "https://data.hetarchief.be/ns/source#"
-TIMEOUT = 0.500
+BATCH_SIZE = 10000
+SHARD_SIZE = 1000
+QUERY_CACHE_SIZE = 128
+PACKAGE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+FILE_CACHE_SIZE = 128
+MAX_CACHED_FILE_SIZE = 1024 * 1024
+MAX_PATH_LENGTH = 4096
+AUTO, PATH, TEXT = "auto", "path", "text"
+
+# Queries of the transformations, by text or by file path and modification time
+query_cache = LRUCache(QUERY_CACHE_SIZE)
+# Contents of the files read by resolve_text, by path, size and modification time
+file_cache = LRUCache(FILE_CACHE_SIZE)
 
 """
 --- Tasks wrt RDF ---
@@ -29,35 +80,31 @@ def sparql_gsp_post(
     graph: str = None,
     content_type: str = "text/turtle",
     auth: AuthBase = None,
-    timeout: float = TIMEOUT,
+    timeout: Union[float, Tuple[float, float]] = None,
+    client: GraphStoreClient = None,
 ):
     """
     Send a POST request to a SPARQL Graph Store HTTP Protocol endpoint
 
     Parameters:
-        - input_data (str): Serialized RDF data to be POSTed to the endpoint
+        - input_data (str): Serialized RDF data or a file path to be POSTed to the endpoint.
+                A file opened in binary mode or an iterable of chunks is streamed.
         - endpoint (str): The URL of the SPARQL Graph Store endpoint
         - graph (str, optional): A URI identifying the named graph to post to.
                 If set to None, the `endpoint` parameter is assumed to be using
                 [Direct Graph Identification](https://www.w3.org/TR/sparql11-http-rdf-update/#direct-graph-identification).
         - content_type (str, optional): the mimeType of the `input_data`. Defaults to "text/turtle".
         - auth (AuthBase, optional): a `requests` library authentication object
+        - timeout (float or tuple, optional): timeout or (connect, read) timeouts that override those of the client
+        - client (GraphStoreClient, optional): client to send the request with. Defaults to a client shared by all tasks.
 
     Returns:
         - True if the POST was successful, False otherwise
     """
-    graph_endpoint = f"{endpoint}?graph={graph}" if graph is not None else endpoint
-    input_text = resolve_text(input_data)
-    req = requests.post(
-        url=graph_endpoint,
-        headers={"Content-Type": content_type},
-        timeout=timeout,
-        auth=auth,
-        data=input_text,
+    input_text = resolve_text(input_data) if isinstance(input_data, str) else input_data
+    return (client or get_default_client()).post(
+        endpoint, input_text, graph, content_type, auth, timeout
     )
-    if req.status_code >= 400:
-        raise Exception(f"POST request to {graph_endpoint} failed: {req.status_code}")
-    return True
 
 
 @task(name="SPARQL Graph Store 1.1 PUT")
@@ -67,40 +114,87 @@ def sparql_gsp_put(
     graph: str = None,
     content_type: str = "text/turtle",
     auth: AuthBase = None,
-    timeout: float = TIMEOUT,
+    timeout: Union[float, Tuple[float, float]] = None,
+    client: GraphStoreClient = None,
 ):
     """
     Send a PUT request to a SPARQL Graph Store HTTP Protocol endpoint
 
     Parameters:
-        - input_data (str): Serialized RDF data to be PUT to the endpoint
+        - input_data (str): Serialized RDF data or a file path to be PUT to the endpoint.
+                A file opened in binary mode or an iterable of chunks is streamed.
         - endpoint (str): The URL of the SPARQL Graph Store endpoint
         - graph (str, optional): A URI identifying the named graph to put to.
                 If set to None, the `endpoint` parameter is assumed to be using
                 [Direct Graph Identification](https://www.w3.org/TR/sparql11-http-rdf-update/#direct-graph-identification).
         - content_type (str, optional): the mimeType of the `input_data`. Defaults to "text/turtle".
         - auth (AuthBase, optional): a `requests` library authentication object
+        - timeout (float or tuple, optional): timeout or (connect, read) timeouts that override those of the client
+        - client (GraphStoreClient, optional): client to send the request with. Defaults to a client shared by all tasks.
 
     Returns:
         - True if the PUT was successful, False otherwise
     """
-    graph_endpoint = f"{endpoint}?graph={graph}" if graph is not None else endpoint
-    input_text = resolve_text(input_data)
-    req = requests.put(
-        url=graph_endpoint,
-        headers={"Content-Type": content_type},
-        timeout=timeout,
-        auth=auth,
-        data=input_text,
+    input_text = resolve_text(input_data) if isinstance(input_data, str) else input_data
+    return (client or get_default_client()).put(
+        endpoint, input_text, graph, content_type, auth, timeout
     )
-    if req.status_code >= 400:
-        raise Exception(f"PUT request to {graph_endpoint} failed: {req.status_code}")
-    return True
+
+
+@task(name="SPARQL Graph Store 1.1 upload file")
+def sparql_gsp_upload_file(
+    path: str,
+    endpoint: str,
+    graph: str = None,
+    content_type: str = "application/n-triples",
+    replace: bool = False,
+    max_bytes: int = None,
+    auth: AuthBase = None,
+    timeout: Union[float, Tuple[float, float]] = None,
+    client: GraphStoreClient = None,
+):
+    """
+    Stream a file to a SPARQL Graph Store HTTP Protocol endpoint without reading it into memory
+
+    Parameters:
+        - path (str): Path of the file with serialized RDF data
+        - endpoint (str): The URL of the SPARQL Graph Store endpoint
+        - graph (str, optional): A URI identifying the named graph to upload to.
+                If set to None, the `endpoint` parameter is assumed to be using
+                [Direct Graph Identification](https://www.w3.org/TR/sparql11-http-rdf-update/#direct-graph-identification).
+        - content_type (str, optional): the mimeType of the file. Defaults to "application/n-triples".
+        - replace (bool, optional): PUT instead of POST the file, replacing the graph. Defaults to False.
+        - max_bytes (int, optional): split the file in requests of at most `max_bytes` bytes.
+                Only line based formats such as N-Triples without blank nodes can be split.
+        - auth (AuthBase, optional): a `requests` library authentication object
+        - timeout (float or tuple, optional): timeout or (connect, read) timeouts that override those of the client
+        - client (GraphStoreClient, optional): client to send the request with. Defaults to a client shared by all tasks.
+
+    Returns:
+        - The number of requests that were sent
+    """
+    logger = get_run_logger()
+    client = client or get_default_client()
+    with open(path, "rb") as f:
+        if max_bytes is not None:
+            count = client.post_split(
+                endpoint, f, max_bytes, graph, content_type, auth, timeout, replace
+            )
+        else:
+            send = client.put if replace else client.post
+            send(endpoint, f, graph, content_type, auth, timeout)
+            count = 1
+    logger.info("Uploaded %s in %d requests.", path, count)
+    return count
 
 
 @task(name="SPARQL Graph Store 1.1 DELETE")
 def sparql_gsp_delete(
-    endpoint: str, graph: str = None, auth: AuthBase = None, timeout: float = TIMEOUT
+    endpoint: str,
+    graph: str = None,
+    auth: AuthBase = None,
+    timeout: Union[float, Tuple[float, float]] = None,
+    client: GraphStoreClient = None,
 ):
     """
     Send a DELETE request to a SPARQL Graph Store HTTP Protocol endpoint
@@ -111,19 +205,13 @@ def sparql_gsp_delete(
                 If set to None, the `endpoint` parameter is assumed to be using
                 [Direct Graph Identification](https://www.w3.org/TR/sparql11-http-rdf-update/#direct-graph-identification).
         - auth (AuthBase, optional): a `requests` library authentication object
+        - timeout (float or tuple, optional): timeout or (connect, read) timeouts that override those of the client
+        - client (GraphStoreClient, optional): client to send the request with. Defaults to a client shared by all tasks.
 
     Returns:
         - True if the DELETE was successful, False otherwise
     """
-    graph_endpoint = f"{endpoint}?graph={graph}" if graph is not None else endpoint
-    req = requests.delete(
-        url=graph_endpoint,
-        auth=auth,
-        timeout=timeout,
-    )
-    if req.status_code >= 400:
-        raise Exception(f"Delete of {graph_endpoint} failed: {req.status_code}")
-    return True
+    return (client or get_default_client()).delete(endpoint, graph, auth, timeout)
 
 
 # SPARQL 1.1 Graph Store HTTP Protocol
@@ -133,7 +221,9 @@ def sparql_gsp_get(
     graph: str = None,
     content_type: str = "text/turtle",
     auth: AuthBase = None,
-    timeout: float = TIMEOUT,
+    timeout: Union[float, Tuple[float, float]] = None,
+    client: GraphStoreClient = None,
+    path: str = None,
 ):
     """
     Send a GET request to a SPARQL Graph Store HTTP Protocol endpoint
@@ -145,20 +235,21 @@ def sparql_gsp_get(
                 [Direct Graph Identification](https://www.w3.org/TR/sparql11-http-rdf-update/#direct-graph-identification).
         - content_type (str, optional): the deisred mimeType of the result. Defaults to "text/turtle".
         - auth (AuthBase, optional): a `requests` library authentication object
+        - timeout (float or tuple, optional): timeout or (connect, read) timeouts that override those of the client
+        - client (GraphStoreClient, optional): client to send the request with. Defaults to a client shared by all tasks.
+        - path (str, optional): stream the graph to this file instead of returning it
 
     Returns:
-        - True if the POST was successful, False otherwise
+        - The serialized graph, or the path of the file it was written to
     """
-    graph_endpoint = f"{endpoint}?graph={graph}" if graph is not None else endpoint
-    req = requests.get(
-        url=graph_endpoint,
-        headers={"Accept": content_type},
-        auth=auth,
-        timeout=timeout,
-    )
-    if req.status_code >= 400:
-        raise Exception(f"POST request to {graph_endpoint} failed: {req.status_code}")
-    return req.text
+    client = client or get_default_client()
+    if path is None:
+        return client.get(endpoint, graph, content_type, auth, timeout)
+
+    logger = get_run_logger()
+    size, lines = client.download(endpoint, path, graph, content_type, auth, timeout)
+    logger.info("Wrote %d bytes in %d lines to %s.", size, lines, path)
+    return path
 
 
 @task(name="execute SPARQL SELECT query")
@@ -168,21 +259,73 @@ def sparql_select(
     method: str = "POST",
     headers: Optional[Dict[str, Any]] = None,
     auth: AuthBase = None,
+    result_format: str = "json",
+    chunk_size: int = 10000,
 ):
     """
     Execute SPARQL SELECT query on a SPARQL endpoint and get the results in a pandas dataframe.
 
+    The results are parsed while they arrive and the dataframe is built in chunks of
+    `chunk_size` rows. Columns get a dtype according to the datatypes of their values:
+    integers, floats, booleans and datetimes, and categoricals for IRIs.
+    Use `sparql_select_batches` to process the results in batches instead.
+
     Parameters:
         - query (str): SPARQL SELECT query to execute
         - endpoint (str): The URL of the SPARQL endpoint
         - method (str): The HTTP method to use. Defaults to POST
         - headers (dict, optional): Python dict with HTTP headers to add.
         - auth (AuthBase, optional): a `requests` library authentication object
+        - result_format (str): "json" for SPARQL JSON results or "tsv" for SPARQL TSV results. Defaults to "json".
+        - chunk_size (int): The number of rows parsed per chunk. Defaults to 10000.
 
     Returns:
         - Pandas DataFrame with query results
     """
-    logger = get_run_logger()
+    kinds = {}
+    variables, batches = _select_batches(
+        query, endpoint, method, headers, auth, result_format, chunk_size, kinds
+    )
+    df = to_dataframe(variables, batches, kinds)
+    get_run_logger().info("Received %d results.", len(df))
+    return df
+
+
+def sparql_select_batches(
+    query: str,
+    endpoint: str,
+    method: str = "POST",
+    headers: Optional[Dict[str, Any]] = None,
+    auth: AuthBase = None,
+    result_format: str = "json",
+    batch_size: int = 10000,
+) -> Iterator[List[dict]]:
+    """
+    Execute SPARQL SELECT query on a SPARQL endpoint and yield the results in batches
+    while they arrive. Rows are dicts with the values of the bound variables,
+    converted to Python types according to their datatypes.
+    Unlike `sparql_select`, this is not a task, so it can be consumed by a flow or a task
+    while the results arrive, and it can also be used outside of a flow run.
+
+    See `sparql_select` for the parameters.
+
+    Returns:
+        - Generator of lists of rows
+    """
+    _, batches = _select_batches(
+        query, endpoint, method, headers, auth, result_format, batch_size
+    )
+    return batches
+
+
+def _select_batches(
+    query, endpoint, method, headers, auth, result_format, batch_size, kinds=None
+):
+    logger = _get_logger()
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(
+            f"Unsupported result format {result_format}, expected one of {list(RESULT_FORMATS)}"
+        )
     sparql = create_sparqlwrapper(endpoint, method, auth)
     query = resolve_text(query)
     sparql.setQuery(query)
@@ -193,19 +336,18 @@ def sparql_select(
     if sparql.method == POST:
         sparql.setOnlyConneg(True)
         sparql.addCustomHttpHeader("Content-type", "application/sparql-query")
-        sparql.addCustomHttpHeader("Accept", "text/csv")
+        sparql.addCustomHttpHeader("Accept", RESULT_FORMATS[result_format])
         sparql.setRequestMethod(POSTDIRECTLY)
 
     if headers is not None:
         for h in headers.items():
             sparql.addCustomHttpHeader(h[0], h[1])
 
-    logger.info("Sending query to %.", endpoint)
+    logger.info("Sending query to %s.", endpoint)
 
-    sparql.setReturnFormat(CSV)
-    results = sparql.query().convert()
-    _csv = StringIO(results.decode("utf-8"))
-    return pd.read_csv(_csv, sep=",")
+    sparql.setReturnFormat(JSON if result_format == "json" else TSV)
+    response = sparql.query().response
+    return iter_result_batches(response, result_format, batch_size, kinds)
 
 
 # SPARQL 1.1 Update
@@ -231,53 +373,185 @@ def sparql_update_query(
         - True if the request was successful, False otherwise
     """
     logger = get_run_logger()
-    sparql = create_sparqlwrapper(endpoint, method, auth)
     query = resolve_text(query)
-    sparql.setQuery(query)
-
-    if sparql.isSparqlUpdateRequest():
-        logger.warning("Query is not an update query.")
-
-    if headers is not None:
-        for h in headers.items():
-            sparql.addCustomHttpHeader(h[0], h[1])
 
     logger.info("Sending query to %s.", endpoint)
 
-    results = sparql.query()
-    logger.info(results.response.read())
-
-    sparql.resetQuery()
+    logger.info(_execute_update(query, endpoint, method, headers, auth, logger))
 
 
 @task(name="insert RDF triples")
-def sparql_update_insert(triples, endpoint, graph=None):
+def sparql_update_insert(
+    triples,
+    endpoint,
+    graph=None,
+    batch_size: int = BATCH_SIZE,
+    max_batch_bytes: int = None,
+    max_workers: int = 1,
+    method: str = "POST",
+    auth: AuthBase = None,
+):
     """
     Insert an iterable of RDFLib triples using SPARQL Update.
 
+    The triples are split in INSERT DATA requests of at most `batch_size` triples
+    and, if set, at most `max_batch_bytes` bytes of serialized triples.
+    The time taken by every batch is logged.
+
     Parameters:
         - triples (List): List of triples
         - endpoint (str): The URL of the SPARQL endpoint
         - graph (str, optional): A URI identifying the named graph to insert the triples into. If set to `None`, the default graph is assumed.
+        - batch_size (int, optional): Maximum number of triples per request. Defaults to 10000.
+        - max_batch_bytes (int, optional): Maximum size of the serialized triples per request.
+        - max_workers (int, optional): Number of requests that are sent in parallel. Defaults to 1.
+        - method (str): The HTTP method to use. Defaults to POST
+        - auth (AuthBase, optional): a `requests` library authentication object
 
     Returns:
         - True if the request was successful, False otherwise
     """
+    logger = get_run_logger()
+    batches = insert_data_batches(triples, graph, batch_size, max_batch_bytes)
+
+    start = time.perf_counter()
+    count = 0
+    n_batches = 0
+    for size, duration in _send_updates(batches, endpoint, method, auth, max_workers):
+        count += size
+        n_batches += 1
+        logger.info(
+            "Inserted batch %d of %d triples in %.3fs.", n_batches, size, duration
+        )
+
+    logger.info(
+        "Inserted %d triples in %d batches in %.3fs.",
+        count,
+        n_batches,
+        time.perf_counter() - start,
+    )
+    return True
+
+
+def insert_data_batches(
+    triples: Iterable,
+    graph: str = None,
+    batch_size: int = BATCH_SIZE,
+    max_batch_bytes: int = None,
+) -> Iterator[Tuple[str, int]]:
+    """
+    Split triples in INSERT DATA queries.
 
-    query = "INSERT DATA {\n"
+    A batch is closed when it holds `batch_size` triples or when adding the next
+    triple would exceed `max_batch_bytes`. A single triple larger than
+    `max_batch_bytes` is sent in a batch of its own.
 
-    if graph is not None:
-        query += f"GRAPH <{graph}> {{\n"
+    Blank nodes are scoped to a request, so all triples that are connected through
+    blank nodes are kept in the same batch, which can exceed the limits for large
+    structures. These triples are collected while the others are streamed, and are
+    sent after them.
 
+    Returns:
+        - Generator of INSERT DATA queries and the number of triples in each of them
+    """
+    if graph is not None:
+        header, footer = f"INSERT DATA {{\nGRAPH <{graph}> {{\n", "}\n}"
+    else:
+        header, footer = "INSERT DATA {\n", "}\n"
+
+    def groups():
+        blank = []
+        for t in triples:
+            if isinstance(t[0], BNode) or isinstance(t[2], BNode):
+                blank.append(t)
+            else:
+                yield [t]
+        yield from _blank_node_groups(blank)
+
+    lines = []
+    size = 0
+    for group in groups():
+        group_lines = [to_ntriples(t) for t in group]
+        group_size = 0
+        if max_batch_bytes is not None:
+            group_size = sum(len(line.encode("utf-8")) for line in group_lines)
+        if lines and (
+            len(lines) + len(group_lines) > batch_size
+            or (max_batch_bytes is not None and size + group_size > max_batch_bytes)
+        ):
+            yield header + "".join(lines) + footer, len(lines)
+            lines, size = [], 0
+        lines.extend(group_lines)
+        size += group_size
+        if len(lines) >= batch_size:
+            yield header + "".join(lines) + footer, len(lines)
+            lines, size = [], 0
+
+    if lines:
+        yield header + "".join(lines) + footer, len(lines)
+
+
+def _blank_node_groups(triples: List[tuple]) -> List[List[tuple]]:
+    """
+    Group triples that share blank nodes, directly or through other triples,
+    in the order of their first triple.
+    """
+    parent = {}
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for s, _, o in triples:
+        nodes = [n for n in (s, o) if isinstance(n, BNode)]
+        for n in nodes:
+            parent.setdefault(n, n)
+        if len(nodes) == 2:
+            parent[find(nodes[0])] = find(nodes[1])
+
+    groups = {}
     for t in triples:
-        query += to_ntriples(t)
+        node = t[0] if isinstance(t[0], BNode) else t[2]
+        groups.setdefault(find(node), []).append(t)
+    return list(groups.values())
 
-    query += "}\n"
 
-    if graph is not None:
-        query += "}"
+def _send_updates(
+    batches: Iterable[Tuple[str, int]],
+    endpoint: str,
+    method: str,
+    auth: AuthBase,
+    max_workers: int,
+) -> Iterator[Tuple[int, float]]:
+    """
+    Send update queries, at most `max_workers` at a time, and yield the number of
+    triples and the duration of every batch in order.
+    """
 
-    return sparql_update_query(query, endpoint)
+    def send(query, size):
+        start = time.perf_counter()
+        _execute_update(query, endpoint, method, auth=auth)
+        return size, time.perf_counter() - start
+
+    if max_workers <= 1:
+        for query, size in batches:
+            yield send(query, size)
+        return
+
+    # Only keep max_workers batches in flight, so the batches are serialized lazily
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = deque()
+    try:
+        for query, size in batches:
+            if len(pending) >= max_workers:
+                yield pending.popleft().result()
+            pending.append(executor.submit(send, query, size))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
 
 
 @task(name="clear graph")
@@ -319,77 +593,249 @@ def compare(input_data1: str, input_data2: str):
 
 
 @task(name="convert json to rdf")
-def json_to_rdf(*input_data: str, ns: str = SRC_NS):
+def json_to_rdf(
+    *input_data: Union[str, bytes],
+    ns: str = SRC_NS,
+    store: RDFStore = None,
+    destination: Union[str, TextIO] = None,
+    dedup: bool = True,
+):
     """
     Converts JSON documents to RDF by direct mapping
 
+    Unless a store is given, the triples are written as N-Triples while the documents
+    are parsed, without adding them to a graph.
+
     Args:
-        input_data*: arbitrary list of JSON strings to map
+        input_data*: arbitrary list of JSON strings or bytes to map
         ns (str, optional): Namespace to use to build RDF predicates. Defaults to https://data.hetarchief.be/ns/source#.
+        store (RDFStore, optional): Store to add the result to instead of serializing it.
+        destination (str or file, optional): File path or text file object to write the result to instead of returning it.
+        dedup (bool, optional): Skip duplicate triples, which keeps the written triples in memory. Defaults to True.
 
     Returns:
-        str: ntriples serialization of the result
+        str: ntriples serialization of the result, or the store or destination when given
     """
-    g = Graph(store="Oxigraph")
-    for data in input_data:
-        if data is None:
-            continue
-
-        for t in parse_json(data, namespace=Namespace(ns)):
-            g.add(t)
-    return g.serialize(format="nt")
+    get_run_logger().debug("Parsing JSON with the %s ijson backend.", get_backend_name())
+    return _direct_mapping(parse_json, input_data, ns, store, destination, dedup)
 
 
 @task(name="convert python dict to rdf")
-def dict_to_rdf(*input_data: dict, ns: str = SRC_NS):
+def dict_to_rdf(
+    *input_data: dict,
+    ns: str = SRC_NS,
+    store: RDFStore = None,
+    destination: Union[str, TextIO] = None,
+    dedup: bool = True,
+):
     """
     Converts Python dict objects to RDF by direct mapping
 
+    Unless a store is given, the triples are written as N-Triples while the dicts
+    are walked, without adding them to a graph.
+
     Args:
         input_data*: arbitrary list of dict to map
         ns (str, optional): Namespace to use to build RDF predicates. Defaults to https://data.hetarchief.be/ns/source#.
+        store (RDFStore, optional): Store to add the result to instead of serializing it.
+        destination (str or file, optional): File path or text file object to write the result to instead of returning it.
+        dedup (bool, optional): Skip duplicate triples, which keeps the written triples in memory. Defaults to True.
 
     Returns:
-        str: ntriples serialization of the result
+        str: ntriples serialization of the result, or the store or destination when given
     """
-    g = Graph(store="Oxigraph")
-    for data in input_data:
-        if data is None:
-            continue
+    return _direct_mapping(parse_dict, input_data, ns, store, destination, dedup)
 
-        for t in parse_dict(data, namespace=Namespace(ns)):
-            g.add(t)
-    return g.serialize(format="nt")
 
+@task(name="convert json lines to rdf")
+def jsonl_to_rdf(
+    path: str,
+    ns: str = SRC_NS,
+    instance_ns: str = None,
+    id_key: str = None,
+    destination: Union[str, TextIO] = None,
+    dedup: bool = False,
+):
+    """
+    Converts a newline-delimited JSON (JSON Lines) file to RDF by direct mapping
+
+    The file is read one record at a time and the triples are written as N-Triples
+    while they are generated, so neither the input nor the output is held in memory
+    when a destination is given.
 
-@task(name="sparql transformation")
-def sparql_transform(input_data: str, query: str):
+    Args:
+        path (str): path of the JSON Lines file
+        ns (str, optional): Namespace to use to build RDF predicates. Defaults to https://data.hetarchief.be/ns/source#.
+        instance_ns (str, optional): Namespace to build the IRIs of the objects in the records with,
+            like {instance_ns}{record}/{object}. Defaults to blank nodes.
+        id_key (str, optional): Key of the unique id of every record, used as {record} in the IRIs.
+            Nested keys are separated by dots. Defaults to a hash of the record.
+        destination (str or file, optional): File path or text file object to write the result to instead of returning it.
+        dedup (bool, optional): Skip duplicate triples, which keeps the written triples in memory. Defaults to False.
+
+    Returns:
+        str: ntriples serialization of the result, or the destination when given
     """
-    Transforms one RDF graph in another using a CONSTRUCT query
+    logger = get_run_logger()
+    logger.debug("Parsing JSON with the %s ijson backend.", get_backend_name())
+    kwargs = {"namespace": Namespace(ns)}
+    if instance_ns is not None:
+        kwargs["instance_ns"] = Namespace(instance_ns)
+
+    with open(path, "rb") as f:
+        result, count = _write_triples(parse_jsonl(f, id_key, **kwargs), destination, dedup)
+
+    logger.info("Converted %s to %d triples.", path, count)
+    return result
+
+
+@task(name="convert json documents to rdf in bulk")
+def bulk_json_to_rdf(
+    input_data: Iterable[Union[str, dict]],
+    destination: str,
+    instance_ns: str,
+    ns: str = SRC_NS,
+    id_key: str = None,
+    shard_size: int = SHARD_SIZE,
+    max_workers: int = None,
+    dedup: bool = True,
+):
+    """
+    Converts many JSON documents or dicts to RDF by direct mapping in parallel processes
+
+    The documents are split in shards of `shard_size` documents that are mapped
+    by a pool of processes. Every shard is written to its own N-Triples file,
+    and the files are concatenated into `destination` in the order of the documents.
+    Instead of blank nodes, the objects in the documents get IRIs in `instance_ns`
+    derived from the id or the content of their document and their position in the
+    document, see `document_namespace`. They don't depend on the position of the
+    document in the input, so the output of separate runs can be merged.
 
     Args:
-        *input_data: input RDF graph serialized as ntriples.
-        query (str): SPARQL construct query either as file path or as query text.
+        input_data: iterable of JSON strings or dicts to map
+        destination (str): path of the N-Triples file to write
+        instance_ns (str): Namespace to use to build the IRIs of the objects, e.g. https://example.org/id/.
+            The IRIs look like https://example.org/id/{document}/{object}.
+        ns (str, optional): Namespace to use to build RDF predicates. Defaults to https://data.hetarchief.be/ns/source#.
+        id_key (str, optional): Key of the unique id of every document, used as {document} in the IRIs.
+            Nested keys are separated by dots. Defaults to a hash of the document.
+        shard_size (int, optional): Number of documents per shard. Defaults to 1000.
+        max_workers (int, optional): Number of processes. Defaults to the number of CPUs.
+        dedup (bool, optional): Skip duplicate triples within a shard. Defaults to True.
 
     Returns:
-        str: result RDF graph serialized as ntriples
+        str: the destination
     """
     logger = get_run_logger()
-    input_graph = Graph(store="Oxigraph")
-    output_graph = Graph(store="Oxigraph")
+    max_workers = max_workers or os.cpu_count()
+    shard_dir = tempfile.mkdtemp(
+        prefix=".shards-", dir=os.path.dirname(os.path.abspath(destination))
+    )
+    documents = iter(input_data)
+    count = 0
+    n_shards = 0
+    try:
+        with ProcessPoolExecutor(max_workers) as executor, open(
+            destination, "wb"
+        ) as output:
+            pending = deque()
+            while True:
+                shard = list(islice(documents, shard_size))
+                if shard:
+                    path = os.path.join(shard_dir, f"{n_shards:08d}.nt")
+                    n_shards += 1
+                    pending.append(
+                        (
+                            path,
+                            executor.submit(
+                                _map_shard, shard, path, ns, instance_ns, id_key, dedup
+                            ),
+                        )
+                    )
+                # Keep the number of shards held in memory bounded
+                while pending and (len(pending) > 2 * max_workers or not shard):
+                    path, future = pending.popleft()
+                    count += future.result()
+                    with open(path, "rb") as f:
+                        shutil.copyfileobj(f, output)
+                    os.remove(path)
+                if not shard:
+                    break
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+    logger.info("Wrote %d triples of %d shards to %s.", count, n_shards, destination)
+    return destination
+
+
+def _map_shard(documents, path, ns, instance_ns, id_key, dedup) -> int:
+    namespace = Namespace(ns)
+    triples = chain.from_iterable(
+        (parse_dict if isinstance(data, dict) else parse_json)(
+            data,
+            namespace=namespace,
+            instance_ns=document_namespace(instance_ns, data, id_key),
+        )
+        for data in documents
+        if data is not None
+    )
+    with open(path, "w", encoding="utf-8") as f:
+        return serialize_triples(triples, f, dedup)
 
-    query = resolve_text(query)
 
-    input_graph.parse(data=input_data, format="nt")
+@task(name="sparql transformation")
+def sparql_transform(
+    input_data: Union[str, RDFStore],
+    query: Union[str, List[str]],
+    output: RDFStore = None,
+    destination: Union[str, BinaryIO] = None,
+):
+    """
+    Transforms one RDF graph in another using a CONSTRUCT query
+
+    When a list of queries is given, the input is loaded once and the results
+    of all queries are combined.
+
+    Args:
+        *input_data: input RDF graph serialized as ntriples, or a store holding it.
+        query (str): SPARQL construct query or list of queries, either as file path or as query text.
+        output (RDFStore, optional): Store to add the result to instead of serializing it.
+        destination (str or file, optional): N-Triples file path or binary file object to stream
+            the result to instead of returning it. Duplicate triples are not removed.
+
+    Returns:
+        str: result RDF graph serialized as ntriples, or the output store or destination when given
+    """
+    if output is not None and destination is not None:
+        raise ValueError("Only one of output and destination can be given.")
 
-    results = input_graph.query(query)
+    logger = get_run_logger()
+    input_store, input_graph = _input_store(input_data)
+    queries = [query] if isinstance(query, str) else query
+
+    # Query and write the results with pyoxigraph, without converting every term to rdflib.
+    # All queries are resolved and parsed before any output is written, so an invalid
+    # query doesn't leave a partial result behind.
+    results = chain.from_iterable(
+        [input_store.query(resolve_query(q), default_graph=input_graph) for q in queries]
+    )
+    _log_query_cache(logger)
 
-    for result in results:
-        output_graph.add(result)
+    if output is not None:
+        output_store, output_graph = output.open(), output.graph_name()
+        output_store.bulk_extend(
+            ox.Quad(t.subject, t.predicate, t.object, output_graph) for t in results
+        )
+        logger.info("Output %d triples", output.count())
+        return output
 
-    logger.info("Output %d triples", len(output_graph))
+    if destination is not None:
+        logger.info("Output %d triples", write_ntriples(results, destination))
+        return destination
 
-    return output_graph.serialize(format="nt")
+    ntriples = serialize_ntriples(results)
+    logger.info("Output %d triples", ntriples.count("\n"))
+    return ntriples
 
 
 def sparql_transform_insert(input_data: str, query: str, target_graph: str):
@@ -405,19 +851,20 @@ def sparql_transform_insert(input_data: str, query: str, target_graph: str):
         str: result RDF graph serialized as ntriples
     """
     logger = get_run_logger()
-    graph = ConjunctiveGraph(store="Oxigraph")
+    store = ox.Store()
 
-    query = resolve_text(query)
+    query = resolve_query(query)
+    _log_query_cache(logger)
 
-    graph.parse(data=input_data, format="nt")
+    load_ntriples(store, input_data)
     logger.info("Inserting in graph %s", target_graph)
 
-    graph.update(query)
-    output_graph = graph.get_graph(URIRef(target_graph))
+    store.update(query)
+    output_graph = ox.NamedNode(target_graph)
 
-    logger.info("Output %d triples", len(output_graph))
+    logger.info("Output %d triples", _count(store, output_graph))
 
-    return output_graph.serialize(format="nt")
+    return dump_ntriples(store, output_graph)
 
 
 @task(name="concatenate ntriples")
@@ -480,12 +927,168 @@ def create_sparqlwrapper(endpoint: str, method: str = None, auth: AuthBase = Non
     return sparql
 
 
-def resolve_text(value):
-    logger = get_run_logger()
-    text_path = os.path.join(os.path.abspath(os.path.dirname(__file__)), value)
-    if os.path.isfile(text_path):
-        with open(text_path, encoding="utf-8") as f:
-            value = f.read()
+def _execute_update(
+    query: str,
+    endpoint: str,
+    method: str = "POST",
+    headers: Optional[Dict[str, Any]] = None,
+    auth: AuthBase = None,
+    logger=None,
+):
+    sparql = create_sparqlwrapper(endpoint, method, auth)
+    sparql.setQuery(query)
+
+    if logger is not None and sparql.isSparqlUpdateRequest():
+        logger.warning("Query is not an update query.")
+
+    if headers is not None:
+        for h in headers.items():
+            sparql.addCustomHttpHeader(h[0], h[1])
+
+    results = sparql.query()
+    response = results.response.read()
+    sparql.resetQuery()
+    return response
+
+
+def _input_store(input_data: Union[str, RDFStore]) -> Tuple[ox.Store, GraphName]:
+    if isinstance(input_data, RDFStore):
+        return input_data.open(), input_data.graph_name()
+    store = ox.Store()
+    load_ntriples(store, input_data)
+    return store, ox.DefaultGraph()
+
+
+def _get_logger():
+    try:
+        return get_run_logger()
+    except MissingContextError:
+        return get_logger(__name__)
+
+
+def _count(store: ox.Store, graph_name: GraphName) -> int:
+    return sum(1 for _ in store.quads_for_pattern(None, None, None, graph_name))
+
+
+def _direct_mapping(parse, input_data, ns, store, destination, dedup):
+    if store is not None and destination is not None:
+        raise ValueError("Only one of store and destination can be given.")
+
+    namespace = Namespace(ns)
+    triples = chain.from_iterable(
+        parse(data, namespace=namespace) for data in input_data if data is not None
+    )
+
+    if store is not None:
+        g = store.get_graph()
+        for t in triples:
+            g.add(t)
+        return store
+
+    return _write_triples(triples, destination, dedup)[0]
+
+
+def _write_triples(
+    triples, destination: Union[str, TextIO, None], dedup: bool
+) -> Tuple[Union[str, TextIO], int]:
+    """
+    Write triples as N-Triples to a file path or text file object, or to a string
+    when `destination` is None.
+
+    Returns the string or the destination, and the number of written triples.
+    """
+    if destination is None:
+        output = StringIO()
+        count = serialize_triples(triples, output, dedup)
+        return output.getvalue(), count
+
+    if isinstance(destination, str):
+        with open(destination, "w", encoding="utf-8") as f:
+            count = serialize_triples(triples, f, dedup)
     else:
-        logger.warning("Path does not point to a file; executing as text.")
-    return value
+        count = serialize_triples(triples, destination, dedup)
+    return destination, count
+
+
+def resolve_query(query: str) -> str:
+    """
+    Resolve a query given as file path or as query text with the "auto" rules of
+    `resolve_text`, through the query cache.
+
+    Query text with a newline is returned as is, without looking at the file system.
+    Other values are cached as text or, when they are the path of a file, by path and
+    modification time, so changes are picked up. pyoxigraph parses a query on every
+    evaluation and has no prepared queries, so the cache holds the query text.
+    """
+    if _is_text(query):
+        return query
+    if ("text", query) in query_cache:
+        return query_cache.get(("text", query), lambda: query)
+
+    path = os.path.join(PACKAGE_DIR, query)
+    info = _stat_file(path)
+    if info is None:
+        return query_cache.get(("text", query), lambda: query)
+    return query_cache.get(("file", path, info.st_mtime_ns), lambda: _read_file(path))
+
+
+def _log_query_cache(logger):
+    logger.debug(
+        "Query cache: %d hits, %d misses", query_cache.hits, query_cache.misses
+    )
+
+
+def resolve_text(value: str, mode: str = AUTO) -> str:
+    """
+    Get the text of a value that is either a file path or the text itself.
+
+    Relative paths are resolved against the directory of this package.
+    Files up to 1 MiB are cached by path, size and modification time.
+
+    Parameters:
+        - value (str): file path or text
+        - mode (str): "path" to require a file, "text" to use the value as is, or "auto" to
+                read the file when the value is the path of one. In "auto" mode values
+                with a newline or longer than any path are used as text without
+                checking the file system. Defaults to "auto".
+
+    Returns:
+        - The text
+    """
+    if mode == TEXT:
+        return value
+    if mode == AUTO:
+        if _is_text(value):
+            return value
+    elif mode != PATH:
+        raise ValueError(f"Unsupported mode {mode}, expected one of {[AUTO, PATH, TEXT]}")
+
+    path = os.path.join(PACKAGE_DIR, value)
+    info = _stat_file(path)
+    if info is None:
+        if mode == PATH:
+            raise FileNotFoundError(f"No such file: {path}")
+        return value
+    if info.st_size > MAX_CACHED_FILE_SIZE:
+        return _read_file(path)
+    return file_cache.get(
+        (path, info.st_size, info.st_mtime_ns), lambda: _read_file(path)
+    )
+
+
+def _is_text(value: str) -> bool:
+    # Paths don't contain newlines and have a limited length
+    return len(value) > MAX_PATH_LENGTH or "\n" in value
+
+
+def _stat_file(path: str) -> Optional[os.stat_result]:
+    try:
+        info = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    return info if stat.S_ISREG(info.st_mode) else None
+
+
+def _read_file(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
@@ -1 +1,2 @@
 from .pagination import *
+from .export import *
\ No newline at end of file
@@ -0,0 +1,107 @@
+import json
+import os
+from importlib.metadata import version
+from typing import Optional, Tuple
+
+from prefect.blocks.core import Block
+from pydantic import Field
+
+
+class PaginationCheckpoint(Block):
+    """
+    Block used to store the progress of a paginated TriplyDB query, so that it can be resumed.
+
+    The checkpoint is updated after every page that was completely consumed.
+    When the name of the checkpoint ends with `.json`, it is stored in that local file
+    instead of in a block on the Prefect server.
+
+    Attributes:
+        name: The name of the checkpoint.
+        query_hash: Hash of the query the checkpoint belongs to.
+        offset: Offset of the first result that was not completely consumed yet.
+        last_key: Key of the last consumed result, when using keyset pagination.
+        completed: Whether all results were consumed.
+
+    Example:
+        Resume a saved query from its last checkpoint:
+        ```python
+        from prefect_meemoo.triplydb import run_saved_query
+        results = run_saved_query(..., checkpoint="harvest-checkpoint", resume=True)
+        ```
+    """
+
+    _block_type_name = "Pagination Checkpoint"
+
+    name: str = Field(default=(...), description="The name of the checkpoint.")
+    query_hash: str = Field(default="", description="Hash of the paginated query.")
+    offset: int = Field(default=0, description="Offset of the next page.")
+    last_key: Optional[str] = Field(
+        default=None, description="Key of the last consumed result."
+    )
+    completed: bool = Field(default=False, description="Whether all results were consumed.")
+    try:
+        _block_schema_capabilities = ["meemoo-prefect", "config", os.environ["BUILD_CONFIG_NAME"]]
+    except KeyError:
+        _block_schema_capabilities = ["meemoo-prefect", "config", "v"+ version('prefect-meemoo')]
+
+    @classmethod
+    def load_checkpoint(cls, name: str) -> Optional["PaginationCheckpoint"]:
+        """
+        Load the checkpoint with the given name, or None if it does not exist.
+        """
+        if _is_file(name):
+            try:
+                with open(name, encoding="utf-8") as f:
+                    return cls(**json.load(f))
+            except FileNotFoundError:
+                return None
+        try:
+            return cls.load(name)
+        except ValueError:
+            return None
+
+    def update(self, offset: int, completed: bool = False, last_key: str = None):
+        """
+        Record the progress of the query and store the checkpoint.
+        """
+        self.offset = offset
+        self.completed = completed
+        self.last_key = last_key
+        if _is_file(self.name):
+            # Write to a temporary file first, so a crash never leaves a corrupt checkpoint
+            tmp = self.name + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(
+                    self.dict(include={"name", "query_hash", "offset", "last_key", "completed"}),
+                    f,
+                )
+            os.replace(tmp, self.name)
+        else:
+            self.save(name=self.name, overwrite=True)
+
+
+def start_checkpoint(
+    name: str, query_hash: str, resume: bool = False
+) -> Tuple[PaginationCheckpoint, bool]:
+    """
+    Get the checkpoint to track a paginated query with.
+
+    When `resume` is set and an unfinished checkpoint of the same query exists, that
+    checkpoint is returned. Otherwise a new checkpoint is started.
+
+    Returns:
+        - The checkpoint and whether it resumes an earlier run
+    """
+    if resume:
+        checkpoint = PaginationCheckpoint.load_checkpoint(name)
+        if (
+            checkpoint is not None
+            and checkpoint.query_hash == query_hash
+            and not checkpoint.completed
+        ):
+            return checkpoint, True
+    return PaginationCheckpoint(name=name, query_hash=query_hash), False
+
+
+def _is_file(name: str) -> bool:
+    return name.endswith(".json")
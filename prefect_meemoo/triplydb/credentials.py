@@ -1,8 +1,19 @@
 import os
+import threading
 from importlib.metadata import version
 
+import requests
 from prefect.blocks.core import Block, SecretStr
 from pydantic import Field
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Per-process caches, shared by all TriplyDB requests
+_lock = threading.Lock()
+_loaded_blocks = {}
+_session = None
+
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
 
 
 class TriplyDBCredentials(Block):
@@ -34,4 +45,65 @@ class TriplyDBCredentials(Block):
     try:
         _block_schema_capabilities = ["meemoo-prefect", "credentials", os.environ["BUILD_CONFIG_NAME"]]
     except KeyError:
-        _block_schema_capabilities = ["meemoo-prefect", "credentials", "v"+ version('prefect-meemoo')]
\ No newline at end of file
+        _block_schema_capabilities = ["meemoo-prefect", "credentials", "v"+ version('prefect-meemoo')]
+
+    @classmethod
+    def load_cached(cls, name: str) -> "TriplyDBCredentials":
+        """
+        Load the block with the given name once per process.
+
+        Following calls return the same block without a round trip to the Prefect server.
+        Use `clear_cache` to pick up changes made to the block afterwards.
+        """
+        with _lock:
+            if name not in _loaded_blocks:
+                _loaded_blocks[name] = cls.load(name)
+            return _loaded_blocks[name]
+
+    @staticmethod
+    def clear_cache():
+        """
+        Forget all cached blocks and close the shared HTTP session.
+        """
+        global _session
+        with _lock:
+            _loaded_blocks.clear()
+            if _session is not None:
+                _session.close()
+                _session = None
+
+    def get_session(self) -> requests.Session:
+        """
+        Helper method to get the HTTP session shared by all TriplyDB requests in this process.
+
+        The session keeps a pool of keep-alive connections, accepts gzip encoded responses
+        and retries requests with an exponential backoff on status codes 429 and 5xx.
+
+        Returns:
+            - A `requests` session
+        """
+        global _session
+        with _lock:
+            if _session is None:
+                _session = _create_session()
+            return _session
+
+
+def _create_session(pool_size: int = 10) -> requests.Session:
+    retry = Retry(
+        total=5,
+        backoff_factor=1,
+        status_forcelist=RETRY_STATUS_CODES,
+        # SPARQL SELECT queries are sent as POST requests, but are safe to retry
+        allowed_methods=None,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return session
@@ -0,0 +1,165 @@
+import csv
+import os
+from itertools import chain, islice
+from typing import Iterable, List, Tuple
+
+from prefect import flow, get_run_logger
+
+from .pagination import (
+    PAGE_SIZE,
+    AdaptivePageSize,
+    _get_logger,
+    iter_saved_query,
+    iter_sparql_select,
+)
+
+FORMATS = ["csv", "parquet"]
+
+
+@flow(name="Export a Triply saved query to a file")
+def export_saved_query(
+    saved_query_uri: str,
+    triplydb_block_name: str,
+    path: str,
+    format: str = None,
+    columns: List[str] = None,
+    limit: int = -1,
+    offset: int = 0,
+    prefetch: int = 0,
+    adaptive_page_size: AdaptivePageSize = None,
+) -> Tuple[str, int]:
+    """
+    Execute a saved query and write the results to a CSV or Parquet file while the pages arrive.
+
+    Only the path and the number of written rows are returned, so the results are never
+    kept in memory as a whole. See `write_results` for the `format` and `columns` parameters
+    and `iter_saved_query` for the other parameters.
+    """
+    logger = get_run_logger()
+    logger.info(f"Exporting saved query results to {path}")
+
+    results = iter_saved_query(
+        saved_query_uri,
+        triplydb_block_name,
+        limit,
+        offset,
+        prefetch,
+        adaptive_page_size,
+    )
+    return write_results(results, path, format, columns)
+
+
+@flow(name="Export a sparql SELECT to a file")
+def export_sparql_select(
+    endpoint: str,
+    sparql: str,
+    triplydb_block_name: str,
+    path: str,
+    format: str = None,
+    columns: List[str] = None,
+    limit: int = -1,
+    offset: int = 0,
+    prefetch: int = 0,
+    order_key: str = None,
+    adaptive_page_size: AdaptivePageSize = None,
+) -> Tuple[str, int]:
+    """
+    Execute a sparql SELECT query and write the results to a CSV or Parquet file while the pages arrive.
+
+    Only the path and the number of written rows are returned, so the results are never
+    kept in memory as a whole. See `write_results` for the `format` and `columns` parameters
+    and `iter_sparql_select` for the other parameters.
+    """
+    logger = get_run_logger()
+    logger.info(f"Exporting sparql SELECT results to {path}")
+
+    results = iter_sparql_select(
+        endpoint,
+        sparql,
+        triplydb_block_name,
+        limit,
+        offset,
+        prefetch,
+        order_key,
+        adaptive_page_size,
+    )
+    return write_results(results, path, format, columns)
+
+
+def write_results(
+    results: Iterable[dict],
+    path: str,
+    format: str = None,
+    columns: List[str] = None,
+    batch_size: int = None,
+) -> Tuple[str, int]:
+    """
+    Write query results to a CSV or Parquet file in batches of `batch_size` rows.
+
+    The `format` is derived from the file extension when not given.
+    When no `columns` are given, they are taken from the keys in the first batch.
+    Parquet files are written with one row group per batch and require `pyarrow`.
+
+    Returns:
+        - The path of the file and the number of written rows
+    """
+    logger = _get_logger()
+    format = format or os.path.splitext(path)[1].lstrip(".").lower()
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported export format {format}, expected one of {FORMATS}")
+
+    batches = _batched(iter(results), batch_size or PAGE_SIZE)
+    first = next(batches, [])
+    if columns is None:
+        columns = list(dict.fromkeys(k for row in first for k in row))
+    batches = chain([first], batches)
+
+    if format == "csv":
+        count = _write_csv(batches, path, columns)
+    else:
+        count = _write_parquet(batches, path, columns)
+
+    logger.info(f"Wrote {count} rows to {path}")
+    return path, count
+
+
+def _batched(results: Iterable[dict], batch_size: int) -> Iterable[List[dict]]:
+    while True:
+        batch = list(islice(results, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _write_csv(batches: Iterable[List[dict]], path: str, columns: List[str]) -> int:
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for batch in batches:
+            writer.writerows(batch)
+            count += len(batch)
+    return count
+
+
+def _write_parquet(batches: Iterable[List[dict]], path: str, columns: List[str]) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in batches:
+            unknown = {k for row in batch for k in row} - set(columns)
+            if unknown:
+                raise ValueError(f"Results contain columns that are not exported: {unknown}")
+            arrays = [
+                pa.array(
+                    [None if row.get(c) is None else str(row[c]) for row in batch],
+                    type=pa.string(),
+                )
+                for c in columns
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(batch)
+    return count
@@ -1,15 +1,74 @@
-import requests
 from requests import Response
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
-from typing import Any, Callable, Iterable, Union
-from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, Tuple, Union
+from itertools import chain, islice, product
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import hashlib
+import json
+import math
 import re
+import time
 
+import ijson
 from prefect import flow, task, get_run_logger
+from prefect.context import FlowRunContext
+from prefect.exceptions import MissingContextError
+from prefect.logging import get_logger
+from pydantic import BaseModel
 
+from .checkpoint import PaginationCheckpoint, start_checkpoint
 from .credentials import TriplyDBCredentials
 
 PAGE_SIZE = 10_000
+# Size of the response chunks that are fed to the JSON parser
+CHUNK_SIZE = 64 * 1024
+# Number of bytes at the start of a page used to detect duplicate pages
+HEAD_SIZE = 64 * 1024
+
+
+class AdaptivePageSize(BaseModel):
+    """
+    Bounds for adaptive page sizing.
+
+    The page size starts at `PAGE_SIZE` and is doubled after a page that was fetched in less
+    than half of `target_duration` seconds. It is halved after a page that took longer than
+    twice `target_duration` seconds, or whose body was larger than `max_bytes`.
+    """
+
+    min_size: int = 1_000
+    max_size: int = 100_000
+    target_duration: float = 5.0
+    max_bytes: int = 64 * 1024 * 1024
+
+
+class SparqlPartitioning(BaseModel):
+    """
+    Splits a SELECT query in partitions that are harvested concurrently.
+
+    Either `values` or `hash_prefix_length` must be set:
+
+    - `values`: one partition per value, bound to `variable` with a `VALUES` clause.
+      Values are SPARQL terms, such as `<https://example.org/graph>` or `"literal"`.
+    - `hash_prefix_length`: 16^n partitions, each selecting the results of which the
+      MD5 hash of the string value of `variable` starts with a given n hex characters.
+    """
+
+    variable: str
+    values: List[str] = None
+    hash_prefix_length: int = None
+
+    def partition_clauses(self) -> List[str]:
+        variable = "?" + self.variable.lstrip("?$")
+        if self.values is not None:
+            return [f"  VALUES {variable} {{ {value} }}\n" for value in self.values]
+        if self.hash_prefix_length is not None:
+            return [
+                f'  FILTER(STRSTARTS(MD5(STR({variable})), "{"".join(prefix)}"))\n'
+                for prefix in product("0123456789abcdef", repeat=self.hash_prefix_length)
+            ]
+        raise ValueError("Either values or hash_prefix_length must be set")
 
 
 @flow(name="Run a Triply saved query with pagination")
@@ -18,12 +77,17 @@ def run_saved_query(
     triplydb_block_name: str,
     limit: int = 10_000,
     offset: int = 0,
+    prefetch: int = 0,
+    adaptive_page_size: AdaptivePageSize = None,
+    checkpoint: str = None,
+    resume: bool = False,
 ) -> Iterable:
     """
     Execute a saved query.
 
     Unlike a simple GET request to a saved query endpoint, this function takes care of pagination. Requires prefect.
-    Results are yielded back as an Iterable. This means that only part of the results are kept in memory at any given time.
+    Results are returned as a list. Use `iter_saved_query` to stream the results instead,
+    so that only one page of results is kept in memory at any given time.
 
     ```py
     results = run_saved_query(...)
@@ -31,26 +95,35 @@ def run_saved_query(
         ...
     ```
 
-    One caveat with the `offset` parameter is that all results up to #`offset + limit` are fetched from the triple store,
-    including the first #`offset` results which are discarded afterwards.
-
     Use a negative `limit` to fetch all results.
+    Pages that lie entirely before `offset` are not requested.
+
+    Set `prefetch` to a positive number K to request the next K pages concurrently
+    while the current page is being consumed. Results are still returned in order.
+
+    Pass an `AdaptivePageSize` to grow or shrink the page size based on the observed
+    latency and payload size of every page, instead of always using `PAGE_SIZE`.
+
+    Set `checkpoint` to the name of a `PaginationCheckpoint` block (or a local `.json` file)
+    to store the progress after every page. With `resume`, an unfinished run of the same
+    query continues after the last completely consumed page instead of starting over.
     """
 
     logger = get_run_logger()
     logger.info("Starting saved query execution")
 
-    def send_request(page: int):
-        uri = add_params_to_uri(
-            saved_query_uri, {"page": page + 1, "pageSize": PAGE_SIZE}
+    return list(
+        iter_saved_query(
+            saved_query_uri,
+            triplydb_block_name,
+            limit,
+            offset,
+            prefetch,
+            adaptive_page_size,
+            checkpoint,
+            resume,
         )
-        return request_triply_get(uri, triplydb_block_name)
-
-    results = _run_query(send_request)
-    if limit < 0:
-        return results
-
-    return [r for r in islice(results, offset, offset + limit)]
+    )
 
 
 @flow(name="Run a sparql SELECT with pagination")
@@ -60,12 +133,19 @@ def run_sparql_select(
     triplydb_block_name: str,
     limit: int = 10_000,
     offset: int = 0,
+    prefetch: int = 0,
+    order_key: str = None,
+    adaptive_page_size: AdaptivePageSize = None,
+    partitioning: SparqlPartitioning = None,
+    checkpoint: str = None,
+    resume: bool = False,
 ) -> Iterable:
     """
     Execute a sparql SELECT query using the given endpoint.
 
     Unlike a simple POST request to a tripple store, this function takes care of pagination. Requires prefect.
-    Results are yielded back as an Iterable. This means that only part of the results are kept in memory at any given time.
+    Results are returned as a list. Use `iter_sparql_select` to stream the results instead,
+    so that only one page of results is kept in memory at any given time.
 
     ```py
     results = run_sparql_select(...)
@@ -73,13 +153,374 @@ def run_sparql_select(
         ...
     ```
 
-    One caveat with the `offset` parameter is that all results up to #`offset + limit` are fetched from the triple store,
-    including the first #`offset` results which are discarded afterwards.
+    The `offset` parameter is pushed down to the triple store as an `OFFSET` clause.
 
     Use a negative `limit` to fetch all results.
+
+    Set `prefetch` to a positive number K to request the next K pages concurrently
+    while the current page is being consumed. Results are still returned in order.
+
+    Set `order_key` to the name of a variable that uniquely identifies a result row to use
+    keyset pagination instead of `LIMIT`/`OFFSET`, see `iter_sparql_select`.
+
+    Pass an `AdaptivePageSize` to grow or shrink the page size based on the observed
+    latency and payload size of every page, instead of always using `PAGE_SIZE`.
+
+    Pass a `SparqlPartitioning` to split the query in partitions that are paginated
+    independently as concurrent task runs. The results are concatenated in the order
+    of the partitions; `limit` and `offset` are then applied to the concatenated results.
+
+    Set `checkpoint` to the name of a `PaginationCheckpoint` block (or a local `.json` file)
+    to store the progress after every page. With `resume`, an unfinished run of the same
+    query continues after the last completely consumed page instead of starting over.
+    Every partition gets its own checkpoint, named after `checkpoint` and the partition number.
     """
-    logger = get_run_logger()
+    if partitioning is not None:
+        _check_sparql_select(sparql)
+        logger = get_run_logger()
+        clauses = partitioning.partition_clauses()
+        logger.info(f"Harvesting {len(clauses)} partitions")
+
+        # Every partition needs at most `offset + limit` results
+        partition_limit = offset + limit if limit >= 0 else -1
+        futures = [
+            run_sparql_select_partition.submit(
+                endpoint,
+                _insert_into_where(sparql, clause),
+                triplydb_block_name,
+                partition_limit,
+                prefetch,
+                order_key,
+                adaptive_page_size,
+                _partition_checkpoint(checkpoint, i),
+                resume,
+            )
+            for i, clause in enumerate(clauses)
+        ]
+        results = chain.from_iterable(future.result() for future in futures)
+        return list(_slice_results(results, limit, offset))
+
+    return list(
+        iter_sparql_select(
+            endpoint,
+            sparql,
+            triplydb_block_name,
+            limit,
+            offset,
+            prefetch,
+            order_key,
+            adaptive_page_size,
+            checkpoint,
+            resume,
+        )
+    )
+
+
+def iter_saved_query(
+    saved_query_uri: str,
+    triplydb_block_name: str,
+    limit: int = -1,
+    offset: int = 0,
+    prefetch: int = 0,
+    adaptive_page_size: AdaptivePageSize = None,
+    checkpoint: str = None,
+    resume: bool = False,
+) -> Iterator[dict]:
+    """
+    Lazily iterate over the results of a saved query.
+
+    A page is only requested once all results of the previous page have been consumed,
+    so at most one page of `PAGE_SIZE` results is kept in memory at any given time.
+    Can be used both inside and outside of a flow run.
+
+    ```py
+    for r in iter_saved_query(...):
+        ...
+    ```
+
+    Use a negative `limit` to fetch all results.
+    Pages that lie entirely before `offset` are not requested.
+
+    Set `prefetch` to a positive number K to request the next K pages concurrently
+    while the current page is being consumed. Results are still returned in order.
+
+    Pass an `AdaptivePageSize` to grow or shrink the page size based on the observed
+    latency and payload size of every page, instead of always using `PAGE_SIZE`.
+
+    Set `checkpoint` to the name of a `PaginationCheckpoint` block (or a local `.json` file)
+    to store the progress after every page. With `resume`, an unfinished run of the same
+    query continues after the last completely consumed page instead of starting over.
+    """
+    first_page, offset = divmod(offset, PAGE_SIZE)
+    start_offset = first_page * PAGE_SIZE
+
+    on_page = None
+    if checkpoint is not None:
+        state, resumed = _start_checkpoint(
+            checkpoint,
+            resume,
+            "saved_query",
+            saved_query_uri,
+            str(start_offset + offset),
+        )
+        if resumed:
+            limit, offset = _resume_slice(limit, offset, state.offset - start_offset)
+            start_offset = state.offset
+        on_page = state.update
+
+    def send_request(page_offset: int, page_size: int) -> Response:
+        uri = add_params_to_uri(
+            saved_query_uri,
+            {"page": page_offset // page_size + 1, "pageSize": page_size},
+        )
+        return _call_request(request_triply_get, uri, triplydb_block_name)
+
+    results = _run_query(
+        send_request,
+        prefetch,
+        _PageSizer(adaptive_page_size, aligned=True),
+        start_offset,
+        on_page,
+    )
+    return _slice_results(results, limit, offset)
+
+
+def iter_sparql_select(
+    endpoint: str,
+    sparql: str,
+    triplydb_block_name: str,
+    limit: int = -1,
+    offset: int = 0,
+    prefetch: int = 0,
+    order_key: str = None,
+    adaptive_page_size: AdaptivePageSize = None,
+    checkpoint: str = None,
+    resume: bool = False,
+) -> Iterator[dict]:
+    """
+    Lazily iterate over the results of a sparql SELECT query using the given endpoint.
+
+    A page is only requested once all results of the previous page have been consumed,
+    so at most one page of `PAGE_SIZE` results is kept in memory at any given time.
+    Can be used both inside and outside of a flow run.
+
+    ```py
+    for r in iter_sparql_select(...):
+        ...
+    ```
+
+    Use a negative `limit` to fetch all results.
+    The `offset` parameter is pushed down to the triple store as an `OFFSET` clause.
+
+    Set `prefetch` to a positive number K to request the next K pages concurrently
+    while the current page is being consumed. Results are still returned in order.
+
+    By default pages are fetched with `LIMIT`/`OFFSET`, which makes the triple store
+    skip all earlier results for every page. Set `order_key` to the name of a variable
+    that uniquely identifies a result row (e.g. `"s"`) to use keyset pagination instead:
+    results are ordered by that variable and every page only asks for keys after the
+    last key of the previous page. The query must not contain an `ORDER BY` clause then,
+    and `prefetch` is not supported since every page depends on the previous one.
+
+    Pass an `AdaptivePageSize` to grow or shrink the page size based on the observed
+    latency and payload size of every page, instead of always using `PAGE_SIZE`.
+
+    Set `checkpoint` to the name of a `PaginationCheckpoint` block (or a local `.json` file)
+    to store the progress after every page. With `resume`, an unfinished run of the same
+    query continues after the last completely consumed page instead of starting over.
+    """
+    _check_sparql_select(sparql)
+
+    if order_key is not None:
+        if prefetch > 0:
+            raise Exception("Keyset pagination does not support prefetching pages")
+        state = None
+        if checkpoint is not None:
+            state, resumed = _start_checkpoint(
+                checkpoint,
+                resume,
+                "sparql_select",
+                endpoint,
+                sparql,
+                str(offset),
+                order_key,
+            )
+            if resumed:
+                limit, _ = _resume_slice(limit, 0, state.offset)
+        results = _run_keyset_query(
+            endpoint,
+            sparql,
+            triplydb_block_name,
+            order_key,
+            offset,
+            _PageSizer(adaptive_page_size),
+            state,
+        )
+        return _slice_results(results, limit, 0)
+
+    start_offset = offset
+    on_page = None
+    if checkpoint is not None:
+        state, resumed = _start_checkpoint(
+            checkpoint, resume, "sparql_select", endpoint, sparql, str(offset)
+        )
+        if resumed:
+            limit, _ = _resume_slice(limit, 0, state.offset - offset)
+            start_offset = state.offset
+        on_page = state.update
+
+    def send_request(page_offset: int, page_size: int) -> Response:
+        paginated_sparql = sparql + f"LIMIT {page_size}\nOFFSET {page_offset}"
+        return _call_request(
+            request_triply_post, endpoint, paginated_sparql, triplydb_block_name
+        )
+
+    results = _run_query(
+        send_request, prefetch, _PageSizer(adaptive_page_size), start_offset, on_page
+    )
+    return _slice_results(results, limit, 0)
 
+
+@task(name="Run a sparql SELECT partition with pagination")
+def run_sparql_select_partition(
+    endpoint: str,
+    sparql: str,
+    triplydb_block_name: str,
+    limit: int = -1,
+    prefetch: int = 0,
+    order_key: str = None,
+    adaptive_page_size: AdaptivePageSize = None,
+    checkpoint: str = None,
+    resume: bool = False,
+) -> List[dict]:
+    """
+    Fetch all results of one partition of a partitioned `run_sparql_select`.
+    """
+    return list(
+        iter_sparql_select(
+            endpoint,
+            sparql,
+            triplydb_block_name,
+            limit,
+            0,
+            prefetch,
+            order_key,
+            adaptive_page_size,
+            checkpoint,
+            resume,
+        )
+    )
+
+
+def _run_keyset_query(
+    endpoint: str,
+    sparql: str,
+    triplydb_block_name: str,
+    order_key: str,
+    offset: int = 0,
+    sizer: "_PageSizer" = None,
+    checkpoint: PaginationCheckpoint = None,
+) -> Iterator[dict]:
+    """
+    Keyset pagination for `iter_sparql_select`.
+
+    The first page skips `offset` results on the server; every following page
+    filters on the key of the last result that was consumed.
+    When resuming from a `checkpoint`, the first page continues after its last key.
+    """
+    order_key = order_key.lstrip("?$")
+    match = re.search(r"(?<!\w)order\s+by", sparql, flags=re.MULTILINE + re.IGNORECASE)
+    if match is not None:
+        raise Exception(
+            "The SPARQL query given to run_sparql must not contain an ORDER BY clause when using an order key"
+        )
+
+    last_key = None
+    start_offset = 0
+    on_page = None
+    if checkpoint is not None:
+        last_key = checkpoint.last_key
+        start_offset = checkpoint.offset
+
+        def on_page(page_offset: int, completed: bool):
+            checkpoint.update(page_offset, completed, last_key)
+
+    def send_request(page_offset: int, page_size: int) -> Response:
+        paginated_sparql = add_keyset_clauses(sparql, order_key, last_key, page_size)
+        if last_key is None and offset > 0:
+            paginated_sparql += f"\nOFFSET {offset}"
+        return _call_request(
+            request_triply_post, endpoint, paginated_sparql, triplydb_block_name
+        )
+
+    for item in _run_query(send_request, 0, sizer, start_offset, on_page):
+        try:
+            last_key = item[order_key]
+        except KeyError:
+            raise Exception(f"Result has no value for order key ?{order_key}: {item}")
+        yield item
+
+
+def add_keyset_clauses(
+    sparql: str, order_key: str, last_key: str = None, page_size: int = None
+) -> str:
+    """
+    Order the SELECT query by `order_key` and only select results with a key after `last_key`.
+
+    Keys are compared by their string value, so both IRIs and literals can be used as key.
+    """
+    variable = "?" + order_key.lstrip("?$")
+    key_filter = ""
+    if last_key is not None:
+        key_filter = (
+            f"  FILTER(STR({variable}) > {json.dumps(last_key, ensure_ascii=False)})\n"
+        )
+    return (
+        _insert_into_where(sparql, key_filter)
+        + f"\nORDER BY STR({variable})\nLIMIT {page_size or PAGE_SIZE}"
+    )
+
+
+def _start_checkpoint(
+    name: str, resume: bool, *query: str
+) -> Tuple[PaginationCheckpoint, bool]:
+    query_hash = hashlib.sha256(json.dumps(query).encode()).hexdigest()
+    state, resumed = start_checkpoint(name, query_hash, resume)
+    if resumed:
+        _get_logger().info(f"Resuming from checkpoint {name} at offset {state.offset}")
+    return state, resumed
+
+
+def _resume_slice(limit: int, offset: int, done: int) -> Tuple[int, int]:
+    """
+    Adjust `limit` and `offset` for the `done` results that were consumed before resuming.
+    """
+    skipped = min(offset, done)
+    if limit >= 0:
+        limit = max(0, limit - (done - skipped))
+    return limit, offset - skipped
+
+
+def _partition_checkpoint(checkpoint: str, partition: int) -> str:
+    if checkpoint is None:
+        return None
+    if checkpoint.endswith(".json"):
+        return f"{checkpoint[:-5]}-{partition}.json"
+    return f"{checkpoint}-{partition}"
+
+
+def _insert_into_where(sparql: str, clause: str) -> str:
+    """
+    Insert a clause at the end of the outermost group pattern of the query.
+    """
+    end = sparql.rindex("}")
+    return sparql[:end] + clause + sparql[end:]
+
+
+def _check_sparql_select(sparql: str):
+    """
+    Make sure the given query can be paginated.
+    """
     # Check for `OFFSET` clause
     match = re.search(r"(?<!\w)offset\s*", sparql, flags=re.MULTILINE + re.IGNORECASE)
     if match is not None:
@@ -94,68 +535,284 @@ def run_sparql_select(
             "The SPARQL query given to run_sparql must not contain an LIMIT clause"
         )
 
-    def send_request(page: int) -> Response:
-        paginated_sparql = sparql + f"LIMIT {PAGE_SIZE}\nOFFSET {page * PAGE_SIZE}"
-        return request_triply_post(endpoint, paginated_sparql, triplydb_block_name)
 
-    results = _run_query(send_request)
+def _slice_results(results: Iterator, limit: int, offset: int) -> Iterator:
     if limit < 0:
-        return results
-
-    return [r for r in islice(results, offset, offset + limit)]
+        return islice(results, offset, None)
+    return islice(results, offset, offset + limit)
 
 
-def _run_query(send_request_fn: Callable[[int], Response]) -> Iterable:
+def _run_query(
+    send_request_fn: Callable[[int, int], Response],
+    prefetch: int = 0,
+    sizer: "_PageSizer" = None,
+    start_offset: int = 0,
+    on_page: Callable[[int, bool], None] = None,
+) -> Iterator:
     """
-    Common logic for the `run_saved_query` and `run_sparql` functions
+    Common logic for the `iter_saved_query` and `iter_sparql_select` functions.
+
+    `send_request_fn` is called with the offset and size of every page.
+    `on_page` is called with the offset of the next page after a page was completely
+    consumed, and whether that was the last page.
+    Pages are fetched lazily: unless `prefetch` is set, the request for page N+1 is
+    only sent once all items of page N have been yielded, and a page is dropped as
+    soon as it is exhausted.
     """
-    logger = get_run_logger()
-    page = 0
+    logger = _get_logger()
+    sizer = sizer if sizer is not None else _PageSizer()
     prev = None
-    items = []
+    total = 0
+    start = time.perf_counter()
+
+    for page, (response, duration, page_offset, page_size) in enumerate(
+        _fetch_pages(send_request_fn, sizer, start_offset, prefetch)
+    ):
+        n_bytes = 0
+
+        def count_bytes(chunks: Iterable[bytes]) -> Iterator[bytes]:
+            nonlocal n_bytes
+            for chunk in chunks:
+                n_bytes += len(chunk)
+                yield chunk
+
+        try:
+            chunks = response.iter_content(chunk_size=CHUNK_SIZE)
+            head = _read_head(chunks)
+
+            digest = hashlib.sha1(head[:HEAD_SIZE]).digest()
+            if digest == prev:
+                logger.info(
+                    "Got duplicate results back, indicating the end of the dataset"
+                )
+                if on_page is not None:
+                    on_page(page_offset, True)
+                return
+            prev = digest
+
+            # Yield the items one by one while the page is being downloaded
+            size = 0
+            for item in _iter_json_items(count_bytes(chain([head], chunks))):
+                size += 1
+                yield item
+        finally:
+            response.close()
+
+        total += size
+        logger.info(
+            f"Fetched {size} results for page {page} (page size {page_size}) in {duration:.2f}s "
+            f"({total / (time.perf_counter() - start):.0f} results/s overall)."
+        )
 
-    while True:
-        # Create and send the query
-        response = send_request_fn(page)
+        completed = size < page_size
+        if on_page is not None:
+            on_page(page_offset + size, completed)
 
-        if response.text == prev:
-            logger.info("Got duplicate results back, indicating the end of the dataset")
-            break
+        if completed:
+            logger.info(
+                f"Got less results than page size {page_size}, indicating of the end of the dataset"
+            )
+            return
 
-        # Yield the items one by one
-        json = response.json()
-        logger.info(f"Fetched {len(json)} results.")
+        sizer.observe(duration, n_bytes, page_size)
 
-        for item in json:
-            # yield item
-            items.append(item)
 
-        if len(json) < PAGE_SIZE:
-            logger.info(
-                f"Got less results than PAGE_SIZE {PAGE_SIZE}, indicating of the end of the dataset"
+class _PageSizer:
+    """
+    Decides the size of every page, optionally adapting it to the observed pages.
+
+    `size` is the page size the sizer would like to use next, while `current` is the
+    size of the last requested page. Page based APIs require the page offset to be a
+    multiple of the page size, so an aligned sizer only switches to a size that divides
+    the offset, and keeps requesting `current` pages until that is possible.
+    """
+
+    def __init__(self, adaptive: AdaptivePageSize = None, aligned: bool = False):
+        self.adaptive = adaptive
+        self.aligned = aligned
+        self.min_size = 1
+        self.size = PAGE_SIZE
+        if adaptive is not None:
+            self.min_size = adaptive.min_size
+            self.size = min(max(PAGE_SIZE, adaptive.min_size), adaptive.max_size)
+        self.current = None
+        self.reason = None
+
+    def next_size(self, offset: int) -> int:
+        size = self.size
+        if self.aligned and offset % size != 0:
+            size = _largest_divisor(offset, self.min_size, size)
+            if size is None:
+                if self.current is not None and offset % self.current == 0:
+                    size = self.current
+                else:
+                    # No divisor of the offset fits the bounds, e.g. when resuming
+                    # at an arbitrary offset, so the page has to be smaller
+                    size = math.gcd(offset, self.size)
+
+        if self.current is not None and size != self.current:
+            _get_logger().info(
+                f"Changing page size from {self.current} to {size} ({self.reason})."
             )
+        self.current = size
+        return size
+
+    def observe(self, duration: float, n_bytes: int, page_size: int):
+        if self.adaptive is None:
+            return
+
+        # Adapt the size of the observed page, which can differ from the wanted size
+        size = page_size
+        if (
+            duration > 2 * self.adaptive.target_duration
+            or n_bytes > self.adaptive.max_bytes
+        ):
+            size = max(self.adaptive.min_size, size // 2)
+        elif (
+            duration < self.adaptive.target_duration / 2
+            and 2 * n_bytes <= self.adaptive.max_bytes
+        ):
+            size = min(self.adaptive.max_size, size * 2)
+
+        self.size = size
+        self.reason = f"last page took {duration:.2f}s for {n_bytes} bytes"
+
+
+def _largest_divisor(n: int, at_least: int, at_most: int) -> Union[int, None]:
+    """
+    Get the largest divisor of `n` between `at_least` and `at_most`, or None.
+    """
+    best = None
+    for d in range(1, math.isqrt(n) + 1):
+        if n % d == 0:
+            for divisor in (d, n // d):
+                if at_least <= divisor <= at_most and (best is None or divisor > best):
+                    best = divisor
+    return best
+
+
+def _read_head(chunks: Iterator[bytes]) -> bytes:
+    """
+    Read chunks until at least `HEAD_SIZE` bytes are read, or the response is exhausted.
+
+    Pages are compared by a digest of their first `HEAD_SIZE` bytes, so a page can be
+    recognized as a duplicate of the previous one before any of its items are yielded.
+    """
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= HEAD_SIZE:
             break
+    return head
 
-        prev = response.text
-        page += 1
-    return items
+
+def _iter_json_items(chunks: Iterable[bytes]) -> Iterator:
+    """
+    Incrementally parse a JSON array and yield its items as soon as they are complete.
+    """
+    items = ijson.sendable_list()
+    coro = ijson.items_coro(items, "item", use_float=True)
+    for chunk in chunks:
+        coro.send(chunk)
+        yield from items
+        del items[:]
+    coro.close()
+    yield from items
+
+
+def _fetch_pages(
+    send_request_fn: Callable[[int, int], Response],
+    sizer: _PageSizer,
+    start_offset: int = 0,
+    prefetch: int = 0,
+) -> Iterator[Tuple[Response, float, int, int]]:
+    """
+    Yields the response, request duration, offset and requested size of each page, in order.
+
+    With a positive `prefetch`, the next `prefetch` pages are requested in a thread pool
+    ahead of consumption. Requests that are still pending when the consumer stops are cancelled.
+    """
+    offset = start_offset
+
+    def next_page() -> Tuple[int, int]:
+        nonlocal offset
+        page_offset, page_size = offset, sizer.next_size(offset)
+        offset += page_size
+        return page_offset, page_size
+
+    def fetch(
+        page_offset: int, page_size: int, preload: bool = False
+    ) -> Tuple[Response, float, int, int]:
+        start = time.perf_counter()
+        response = send_request_fn(page_offset, page_size)
+        if preload:
+            # Download the body in the worker thread as well
+            response.content
+        return response, time.perf_counter() - start, page_offset, page_size
+
+    if prefetch <= 0:
+        while True:
+            yield fetch(*next_page())
+
+    executor = ThreadPoolExecutor(max_workers=prefetch)
+    pending = deque()
+
+    def submit():
+        # Copy the context so the Prefect run context is available in the worker thread
+        context = contextvars.copy_context()
+        pending.append(executor.submit(context.run, fetch, *next_page(), True))
+
+    try:
+        for _ in range(prefetch + 1):
+            submit()
+        while True:
+            yield pending.popleft().result()
+            submit()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        # Return the connections of prefetched pages that won't be read to the pool
+        for future in pending:
+            future.add_done_callback(_close_prefetched)
+
+
+def _close_prefetched(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result()[0].close()
+
+
+def _call_request(request_task, *args) -> Response:
+    """
+    Run a request task as a Prefect task inside a flow run, or as a plain function otherwise.
+    """
+    if FlowRunContext.get() is not None:
+        return request_task(*args)
+    return request_task.fn(*args)
+
+
+def _get_logger():
+    try:
+        return get_run_logger()
+    except MissingContextError:
+        return get_logger(__name__)
 
 
 @task
 def request_triply_get(endpoint: str, triplydb_block_name: str) -> Response:
     """
     Send a GET request including the triply token to the given endpoint.
+
+    The response body is streamed, so it is only downloaded while it is being read.
     """
-    logger = get_run_logger()
+    logger = _get_logger()
 
     # Load credentials
-    credentials = TriplyDBCredentials.load(triplydb_block_name)
+    credentials = TriplyDBCredentials.load_cached(triplydb_block_name)
     bearer_token = credentials.token.get_secret_value()
 
     # Send GET request
     headers = get_triply_headers(bearer_token)
     logger.info(f"Sending GET request to {endpoint}")
-    response = requests.get(endpoint, headers=headers)
+    response = credentials.get_session().get(endpoint, headers=headers, stream=True)
 
     if response.status_code != 200:
         raise Exception(f"Status code {response.status_code} - {response.reason}")
@@ -166,11 +823,13 @@ def request_triply_get(endpoint: str, triplydb_block_name: str) -> Response:
 def request_triply_post(endpoint: str, body: str, triplydb_block_name: str) -> Response:
     """
     Send a POST request including the triply token to the given endpoint.
+
+    The response body is streamed, so it is only downloaded while it is being read.
     """
-    logger = get_run_logger()
+    logger = _get_logger()
 
     # Load credentials
-    credentials = TriplyDBCredentials.load(triplydb_block_name)
+    credentials = TriplyDBCredentials.load_cached(triplydb_block_name)
     bearer_token = credentials.token.get_secret_value()
 
     # Send POST request
@@ -180,7 +839,9 @@ def request_triply_post(endpoint: str, body: str, triplydb_block_name: str) -> R
     )
 
     logger.info(f"Sending POST request to {endpoint}")
-    response = requests.post(endpoint, headers=headers, data=body)
+    response = credentials.get_session().post(
+        endpoint, headers=headers, data=body, stream=True
+    )
 
     if response.status_code != 200:
         logger.error(f"Status code {response.status_code} - {response.reason}")
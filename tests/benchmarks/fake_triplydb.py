@@ -0,0 +1,87 @@
+"""
+Local stand-in for a TriplyDB saved query / SPARQL endpoint, used by the benchmarks.
+
+Saved queries are served on `/run` with the `page` and `pageSize` parameters,
+SPARQL SELECT queries are POSTed to `/sparql` and paginated with `LIMIT`/`OFFSET`
+or with the keyset filter on `?s`.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeTriplyDB:
+    def __init__(self, n_rows: int, row_width: int = 3, latency: float = 0.0):
+        self.n_rows = n_rows
+        self.row_width = row_width
+        self.latency = latency
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def row(self, i: int) -> dict:
+        # Zero padded keys keep the string order equal to the row order
+        row = {"s": f"https://example.org/id/{i:012d}"}
+        for v in range(self.row_width - 1):
+            row[f"v{v}"] = f"value {v} of row {i}"
+        return row
+
+    def page(self, offset: int, limit: int, after_key: str = None) -> bytes:
+        if after_key is not None:
+            offset = int(after_key.rsplit("/", 1)[1]) + 1
+        end = min(offset + limit, self.n_rows)
+        return json.dumps([self.row(i) for i in range(offset, end)]).encode()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                params = parse_qs(urlparse(self.path).query)
+                page, page_size = int(params["page"][0]), int(params["pageSize"][0])
+                self._respond(fake.page((page - 1) * page_size, page_size))
+
+            def do_POST(self):
+                sparql = self.rfile.read(int(self.headers["Content-Length"])).decode()
+                limit = int(re.search(r"LIMIT (\d+)", sparql).group(1))
+                offset = re.search(r"OFFSET (\d+)", sparql)
+                after_key = re.search(r'STR\(\?s\) > "(.*)"', sparql)
+                self._respond(
+                    fake.page(
+                        int(offset.group(1)) if offset else 0,
+                        limit,
+                        after_key.group(1) if after_key else None,
+                    )
+                )
+
+            def _respond(self, body: bytes):
+                with fake._lock:
+                    fake.request_count += 1
+                time.sleep(fake.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,118 @@
+"""
+Throughput and memory benchmarks of the TriplyDB pagination engine.
+
+Run with `RUN_BENCHMARKS=1 pytest tests/benchmarks --benchmark-columns=mean,rounds`.
+Rows/second, peak traced memory and request count of every case are stored in the
+`extra_info` of the benchmark results (see `--benchmark-json`). The peak is measured
+with tracemalloc per case, unlike the RSS high-water mark of the whole process.
+"""
+import os
+import time
+import tracemalloc
+from unittest import mock
+
+import pytest
+
+from prefect_meemoo.triplydb.credentials import TriplyDBCredentials
+from prefect_meemoo.triplydb.pagination import (
+    iter_saved_query,
+    iter_sparql_select,
+    run_saved_query,
+    run_sparql_select,
+)
+
+from fake_triplydb import FakeTriplyDB
+
+pytestmark = pytest.mark.skipif(
+    os.environ.get("RUN_BENCHMARKS") is None, reason="RUN_BENCHMARKS is not set"
+)
+
+SPARQL = "SELECT * WHERE { ?s ?p ?o }"
+
+
+@pytest.fixture(autouse=True)
+def credentials():
+    TriplyDBCredentials.clear_cache()
+    credentials = TriplyDBCredentials(host="http://localhost", token="token")
+    with mock.patch.object(TriplyDBCredentials, "load", return_value=credentials):
+        yield credentials
+    TriplyDBCredentials.clear_cache()
+
+
+def consume(results) -> int:
+    count = 0
+    for _ in results:
+        count += 1
+    return count
+
+
+def run_benchmark(benchmark, server: FakeTriplyDB, run):
+    # Measure memory in a separate run, since tracing allocations slows everything down
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    server.request_count = 0
+    start = time.perf_counter()
+    rows = benchmark.pedantic(run, rounds=3, iterations=1)
+    duration = (time.perf_counter() - start) / 3
+
+    assert rows == server.n_rows
+    benchmark.extra_info.update(
+        {
+            "rows_per_second": rows / duration,
+            "peak_traced_memory_mb": peak / 2**20,
+            "request_count": server.request_count / 3,
+        }
+    )
+
+
+@pytest.mark.parametrize("n_rows", [20_000, 200_000])
+@pytest.mark.parametrize("row_width", [3, 20])
+@pytest.mark.parametrize("prefetch", [0, 4])
+def test_benchmark_iter_saved_query(benchmark, n_rows, row_width, prefetch):
+    with FakeTriplyDB(n_rows, row_width, latency=0.05) as server:
+        run_benchmark(
+            benchmark,
+            server,
+            lambda: consume(
+                iter_saved_query(f"{server.url}/run", "triplydb", prefetch=prefetch)
+            ),
+        )
+
+
+@pytest.mark.parametrize("n_rows", [20_000, 200_000])
+@pytest.mark.parametrize("row_width", [3, 20])
+@pytest.mark.parametrize("order_key", [None, "s"])
+def test_benchmark_iter_sparql_select(benchmark, n_rows, row_width, order_key):
+    with FakeTriplyDB(n_rows, row_width, latency=0.05) as server:
+        run_benchmark(
+            benchmark,
+            server,
+            lambda: consume(
+                iter_sparql_select(
+                    f"{server.url}/sparql", SPARQL, "triplydb", order_key=order_key
+                )
+            ),
+        )
+
+
+def test_benchmark_run_saved_query(benchmark):
+    with FakeTriplyDB(50_000) as server:
+        run_benchmark(
+            benchmark,
+            server,
+            lambda: len(run_saved_query(f"{server.url}/run", "triplydb", limit=-1)),
+        )
+
+
+def test_benchmark_run_sparql_select(benchmark):
+    with FakeTriplyDB(50_000) as server:
+        run_benchmark(
+            benchmark,
+            server,
+            lambda: len(
+                run_sparql_select(f"{server.url}/sparql", SPARQL, "triplydb", limit=-1)
+            ),
+        )
@@ -0,0 +1,59 @@
+"""
+Benchmarks of the RDF transformation tasks.
+
+Run with `RUN_BENCHMARKS=1 pytest tests/benchmarks/test_rdf_benchmark.py`.
+The number of input triples defaults to 1M and can be changed with `BENCHMARK_TRIPLES`.
+"""
+import os
+from unittest import mock
+
+import pytest
+from rdflib import Graph
+
+from prefect_meemoo.rdf import tasks
+
+pytestmark = pytest.mark.skipif(
+    os.environ.get("RUN_BENCHMARKS") is None, reason="RUN_BENCHMARKS is not set"
+)
+
+N_TRIPLES = int(os.environ.get("BENCHMARK_TRIPLES", 1_000_000))
+QUERY = """
+CONSTRUCT { ?s <http://schema.org/name> ?o }
+WHERE { ?s <https://data.hetarchief.be/ns/source#title> ?o }
+"""
+
+
+@pytest.fixture(scope="module")
+def ntriples() -> str:
+    return "".join(
+        f'<https://example.org/id/{i // 2}> '
+        f'<https://data.hetarchief.be/ns/source#{"title" if i % 2 else "id"}> '
+        f'"value of triple {i}" .\n'
+        for i in range(N_TRIPLES)
+    )
+
+
+@pytest.fixture(autouse=True)
+def logger():
+    with mock.patch.object(tasks, "get_run_logger"):
+        yield
+
+
+def rdflib_transform(input_data: str, query: str) -> str:
+    # Previous implementation, routing every triple through rdflib terms
+    input_graph = Graph(store="Oxigraph")
+    output_graph = Graph(store="Oxigraph")
+    input_graph.parse(data=input_data, format="nt")
+    for result in input_graph.query(query):
+        output_graph.add(result)
+    return output_graph.serialize(format="nt")
+
+
+def test_benchmark_sparql_transform_rdflib(benchmark, ntriples):
+    result = benchmark.pedantic(rdflib_transform, (ntriples, QUERY), rounds=1)
+    assert result.count("\n") == N_TRIPLES // 2
+
+
+def test_benchmark_sparql_transform_native(benchmark, ntriples):
+    result = benchmark.pedantic(tasks.sparql_transform.fn, (ntriples, QUERY), rounds=3)
+    assert result.count("\n") == N_TRIPLES // 2
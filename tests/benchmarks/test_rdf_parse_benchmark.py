@@ -0,0 +1,173 @@
+"""
+Benchmarks of the direct mapping of JSON and dicts to RDF.
+
+Run with `RUN_BENCHMARKS=1 pytest tests/benchmarks/test_rdf_parse_benchmark.py`.
+The current implementation is compared with the previous one, which dispatched
+events with a chain of comparisons and walked dicts with nested generators,
+and the ijson backends are compared on a large document given as bytes and as str.
+Backends that can't be loaded in this environment are skipped.
+"""
+import json
+import os
+from collections import deque
+
+import ijson
+import pytest
+from rdflib import BNode, Literal, Namespace
+
+from prefect_meemoo.rdf.rdf_parse import BACKENDS, parse_dict, parse_json
+
+pytestmark = pytest.mark.skipif(
+    os.environ.get("RUN_BENCHMARKS") is None, reason="RUN_BENCHMARKS is not set"
+)
+
+N_RECORDS = 2000
+NS = Namespace("https://data.hetarchief.be/ns/source#")
+
+
+def mediahaven_record(i: int) -> dict:
+    return {
+        "Internal": {
+            "MediaObjectId": f"{i:032x}",
+            "FragmentId": f"{i:064x}",
+            "IsFragment": False,
+            "PathToKeyframe": f"/keyframes/{i}.jpg",
+            "Browses": {
+                "Browse": [
+                    {
+                        "PathToVideo": f"/browse/{i}/{j}.mp4",
+                        "Container": "mp4",
+                        "FileSize": 1000 * i + j,
+                        "HasKeyframes": True,
+                    }
+                    for j in range(3)
+                ]
+            },
+        },
+        "Administrative": {
+            "Type": "video",
+            "OrganisationName": "meemoo",
+            "ArchiveStatus": "on_tape",
+            "RecordStatus": "Published",
+        },
+        "Descriptive": {
+            "Title": f"Record {i}",
+            "Description": "A description " * 20,
+            "CreationDate": "2022-01-01T10:00:00Z",
+            "Keywords": {"Keyword": ["news", "sports", "weather", f"keyword {i}"]},
+        },
+        "Dynamic": {
+            "dc_identifier_localid": f"local-{i}",
+            "PID": f"pid{i:07d}",
+            "dcterms_created": "2022-01-01",
+            "dc_titles": {"serie": ["Journaal"], "programma": ["Het Journaal"]},
+            "dc_creators": {"Maker": ["A", "B"]},
+            "ebucore_duration": 1234.5,
+        },
+    }
+
+
+@pytest.fixture(scope="module")
+def records():
+    return [mediahaven_record(i) for i in range(N_RECORDS)]
+
+
+@pytest.fixture(scope="module")
+def large_document(records):
+    return json.dumps({"Records": records})
+
+
+def previous_parse_dict(data, **kwargs):
+    def basic_parse(data):
+        if isinstance(data, dict):
+            yield "start_map", None
+            for k, v in data.items():
+                yield "map_key", k
+                for event, value in basic_parse(v):
+                    yield event, value
+            yield "end_map", None
+        elif isinstance(data, list):
+            yield "start_array", None
+            for i in data:
+                for event, value in basic_parse(i):
+                    yield event, value
+            yield "end_array", None
+        elif data is None:
+            yield "null", data
+        elif isinstance(data, str):
+            yield "string", data
+        elif isinstance(data, bool):
+            yield "boolean", data
+        elif isinstance(data, int):
+            yield "integer", data
+        elif isinstance(data, float):
+            yield "double", data
+
+    return previous_parse_events(basic_parse(data), **kwargs)
+
+
+def previous_parse_events(events, namespace):
+    subject_stack = deque([])
+    array_properties = {}
+    prop = None
+    for event, value in events:
+        if event == "start_array" and subject_stack and prop is not None:
+            array_properties[subject_stack[-1]] = prop
+        if event == "end_array" and subject_stack:
+            array_properties.pop(subject_stack[-1], None)
+        if event == "start_map":
+            subject = BNode()
+            if prop is not None and subject_stack:
+                yield (subject_stack[-1], prop, subject)
+            subject_stack.append(subject)
+        if event == "end_map":
+            subject_stack.pop()
+            if subject_stack and subject_stack[-1] in array_properties:
+                prop = array_properties[subject_stack[-1]]
+        if event in ["boolean", "integer", "double", "number"]:
+            yield (subject_stack[-1], prop, Literal(value))
+        if event == "string" and prop is not None:
+            yield (subject_stack[-1], prop, Literal(value))
+        if event == "map_key":
+            prop = namespace[value]
+
+
+def count_triples(parse, records) -> int:
+    return sum(1 for record in records for _ in parse(record, namespace=NS))
+
+
+def test_benchmark_parse_dict_previous(benchmark, records):
+    benchmark(count_triples, previous_parse_dict, records)
+
+
+def test_benchmark_parse_dict(benchmark, records):
+    benchmark(count_triples, parse_dict, records)
+
+
+def test_benchmark_parse_json_previous(benchmark, records):
+    documents = [json.dumps(r) for r in records]
+    benchmark(
+        count_triples,
+        lambda d, namespace: previous_parse_events(
+            ijson.basic_parse(d, use_float=True), namespace
+        ),
+        documents,
+    )
+
+
+def test_benchmark_parse_json(benchmark, records):
+    documents = [json.dumps(r) for r in records]
+    benchmark(count_triples, parse_json, documents)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("input_type", [bytes, str])
+def test_benchmark_parse_json_backend(benchmark, large_document, backend, input_type):
+    try:
+        ijson.get_backend(backend)
+    except ImportError as e:
+        pytest.skip(f"ijson backend {backend} is not available: {e}")
+    document = large_document.encode("utf-8") if input_type is bytes else large_document
+    benchmark(
+        lambda: sum(1 for _ in parse_json(document, backend=backend, namespace=NS))
+    )
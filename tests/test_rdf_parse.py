@@ -0,0 +1,109 @@
+import io
+import json
+
+import pytest
+from rdflib import Literal, Namespace
+
+from prefect_meemoo.rdf.rdf_parse import (
+    BACKENDS,
+    document_namespace,
+    get_backend_name,
+    parse_dict,
+    parse_json,
+    parse_jsonl,
+)
+
+NS = Namespace("urn:p:")
+INSTANCE_NS = Namespace("urn:i:")
+
+DOCUMENT = {
+    "id": "1",
+    "a": [[1, {"n": None}], {"x": {"y": 1.5}}, {"z": True}],
+    "b": "t",
+    "c": ["s", 2, [3]],
+    "d": {},
+    "e": [1.0, "1", 1],
+}
+
+# Output of the original recursive implementation, including the property
+# that leaks out of the nested array into "a"
+EXPECTED = [
+    (INSTANCE_NS["0"], NS.id, Literal("1")),
+    (INSTANCE_NS["0"], NS.a, Literal(1)),
+    (INSTANCE_NS["0"], NS.a, INSTANCE_NS["1"]),
+    (INSTANCE_NS["0"], NS.a, INSTANCE_NS["2"]),
+    (INSTANCE_NS["2"], NS.x, INSTANCE_NS["3"]),
+    (INSTANCE_NS["3"], NS.y, Literal(1.5)),
+    (INSTANCE_NS["0"], NS.y, INSTANCE_NS["4"]),
+    (INSTANCE_NS["4"], NS.z, Literal(True)),
+    (INSTANCE_NS["0"], NS.b, Literal("t")),
+    (INSTANCE_NS["0"], NS.c, Literal("s")),
+    (INSTANCE_NS["0"], NS.c, Literal(2)),
+    (INSTANCE_NS["0"], NS.c, Literal(3)),
+    (INSTANCE_NS["0"], NS.d, INSTANCE_NS["5"]),
+    (INSTANCE_NS["0"], NS.e, Literal(1.0)),
+    (INSTANCE_NS["0"], NS.e, Literal("1")),
+    (INSTANCE_NS["0"], NS.e, Literal(1)),
+]
+
+
+@pytest.mark.parametrize(
+    "parse, data",
+    [
+        (parse_dict, DOCUMENT),
+        (parse_json, json.dumps(DOCUMENT)),
+        (parse_json, json.dumps(DOCUMENT).encode("utf-8")),
+        (parse_json, io.BytesIO(json.dumps(DOCUMENT).encode("utf-8"))),
+    ],
+    ids=["dict", "str", "bytes", "file"],
+)
+def test_direct_mapping(parse, data):
+    triples = list(parse(data, namespace=NS, instance_ns=INSTANCE_NS))
+
+    # Compare datatypes too, since 1, 1.0 and True are equal in python
+    assert [tuple(map(repr, t)) for t in triples] == [tuple(map(repr, t)) for t in EXPECTED]
+
+
+@pytest.mark.parametrize("parse, data", [(parse_dict, {"a": 0.0, "b": -0.0}), (parse_json, '{"a": 0.0, "b": -0.0}')])
+def test_negative_zero(parse, data):
+    triples = list(parse(data, namespace=NS))
+
+    assert [o for _, _, o in triples] == [Literal(0.0), Literal(-0.0)]
+    assert str(triples[1][2]) == "-0.0"
+
+
+def test_parse_json_backend():
+    assert get_backend_name() in BACKENDS
+
+    data = json.dumps(DOCUMENT).encode("utf-8")
+    triples = list(parse_json(data, backend="python", namespace=NS, instance_ns=INSTANCE_NS))
+
+    assert triples == EXPECTED
+
+
+def test_document_namespace():
+    record = {"Dynamic": {"PID": "a b"}, "n": 1}
+
+    assert document_namespace(INSTANCE_NS, record, "Dynamic.PID") == "urn:i:a%20b/"
+    assert document_namespace(INSTANCE_NS, json.dumps(record), "Dynamic.PID") == "urn:i:a%20b/"
+    assert document_namespace(INSTANCE_NS, record) == document_namespace(
+        INSTANCE_NS, {"n": 1, "Dynamic": {"PID": "a b"}}
+    )
+    assert document_namespace(INSTANCE_NS, record) == document_namespace(
+        INSTANCE_NS, b'{"n": 1,\n "Dynamic": {"PID": "a b"}}'
+    )
+    assert document_namespace(INSTANCE_NS, record) != document_namespace(INSTANCE_NS, {"n": 2})
+    with pytest.raises(ValueError, match="no value for id key"):
+        document_namespace(INSTANCE_NS, record, "PID")
+
+
+def test_parse_jsonl():
+    lines = [b'{"id": 1, "item": {"n": "a"}}\n', b"\n", b'{"id": 2}\n']
+    triples = list(parse_jsonl(iter(lines), "id", namespace=NS, instance_ns=INSTANCE_NS))
+
+    assert triples == [
+        (INSTANCE_NS["1/0"], NS.id, Literal(1)),
+        (INSTANCE_NS["1/0"], NS.item, INSTANCE_NS["1/1"]),
+        (INSTANCE_NS["1/1"], NS.n, Literal("a")),
+        (INSTANCE_NS["2/0"], NS.id, Literal(2)),
+    ]
@@ -0,0 +1,416 @@
+import gzip
+import os
+import io
+import json
+from unittest import mock
+
+import pyoxigraph as ox
+import pytest
+from rdflib import Graph, Literal, Namespace, URIRef
+from rdflib.compare import isomorphic
+
+from prefect_meemoo.rdf import tasks
+from prefect_meemoo.rdf.gsp import GraphStoreClient
+from prefect_meemoo.rdf.rdf_parse import parse_dict
+from prefect_meemoo.rdf.sparql_results import INTEGER, XSD, to_dataframe
+from prefect_meemoo.rdf.store import RDFStore, close_stores
+
+TRIPLES = [
+    (URIRef(f"http://localhost/{i}"), URIRef("http://localhost/p"), Literal(f"value {i}"))
+    for i in range(5)
+]
+
+
+@pytest.fixture(autouse=True)
+def logger():
+    with mock.patch.object(tasks, "get_run_logger") as get_run_logger:
+        yield get_run_logger.return_value
+
+
+def parse_insert(query: str) -> Graph:
+    g = Graph()
+    g.update(query)
+    return g
+
+
+def test_insert_data_batches_by_count():
+    batches = list(tasks.insert_data_batches(TRIPLES, batch_size=2))
+
+    assert [size for _, size in batches] == [2, 2, 1]
+    assert len(parse_insert(batches[0][0])) == 2
+
+
+def test_insert_data_batches_keep_blank_nodes_together():
+    triples = list(parse_dict({"a": {"b": 1, "c": 2, "d": 3}})) + TRIPLES[:2]
+    store = ox.Store()
+
+    batches = list(tasks.insert_data_batches(triples, batch_size=2))
+    for query, _ in batches:
+        store.update(query)
+
+    # Blank nodes are scoped to a request, so splitting them would create new nodes
+    assert [size for _, size in batches] == [2, 4]
+    assert len({q.subject for q in store}) == 4
+
+
+def test_insert_data_batches_by_bytes():
+    line_size = len(tasks.to_ntriples(TRIPLES[0]).encode())
+    batches = list(
+        tasks.insert_data_batches(
+            TRIPLES, graph="http://localhost/g", max_batch_bytes=3 * line_size
+        )
+    )
+
+    assert [size for _, size in batches] == [3, 2]
+    assert 'GRAPH <http://localhost/g>' in batches[0][0]
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_sparql_update_insert(max_workers, logger):
+    with mock.patch.object(tasks, "_execute_update") as execute_update:
+        assert tasks.sparql_update_insert.fn(
+            iter(TRIPLES), "http://localhost/sparql", batch_size=2, max_workers=max_workers
+        )
+
+    inserted = Graph()
+    for call in execute_update.call_args_list:
+        inserted.update(call.args[0])
+    assert len(inserted) == len(TRIPLES)
+    logger.info.assert_called_with("Inserted %d triples in %d batches in %.3fs.", 5, 3, mock.ANY)
+
+
+def test_gsp_post_gzip():
+    client = GraphStoreClient(read_timeout=120, gzip=True)
+    with mock.patch.object(client.session, "request") as request:
+        request.return_value.status_code = 204
+        assert tasks.sparql_gsp_post.fn(
+            "<a:s> <a:p> <a:o> .", "http://localhost/store", "http://localhost/g",
+            "application/n-triples", client=client,
+        )
+
+    args, kwargs = request.call_args
+    assert args == ("POST", "http://localhost/store")
+    assert kwargs["params"] == {"graph": "http://localhost/g"}
+    assert kwargs["timeout"] == (3.05, 120)
+    assert kwargs["headers"]["Content-Encoding"] == "gzip"
+    assert gzip.decompress(kwargs["data"]) == b"<a:s> <a:p> <a:o> ."
+
+
+def test_gsp_retries_post_only_when_refused():
+    retry = GraphStoreClient().session.get_adapter("http://localhost").max_retries
+
+    assert retry.is_retry("POST", 503)
+    assert retry.is_retry("POST", 429)
+    assert not retry.is_retry("POST", 500)
+    assert not retry.is_retry("POST", 504)
+    assert retry.is_retry("PUT", 500)
+    assert "POST" not in retry.allowed_methods
+
+
+def test_gsp_get_failure():
+    client = GraphStoreClient()
+    with mock.patch.object(client.session, "request") as request:
+        request.return_value.status_code = 404
+        with pytest.raises(Exception, match="GET request to http://localhost/store failed: 404"):
+            tasks.sparql_gsp_get.fn("http://localhost/store", client=client)
+
+
+def test_gsp_upload_file_split(tmp_path):
+    path = tmp_path / "data.nt"
+    lines = [tasks.to_ntriples(t).encode() for t in TRIPLES]
+    path.write_bytes(b"".join(lines))
+    client = GraphStoreClient()
+    with mock.patch.object(client.session, "request") as request:
+        request.return_value.status_code = 204
+        count = tasks.sparql_gsp_upload_file.fn(
+            str(path), "http://localhost/store", replace=True,
+            max_bytes=2 * len(lines[0]), client=client,
+        )
+
+    assert count == 3
+    assert [call.args[0] for call in request.call_args_list] == ["PUT", "POST", "POST"]
+    assert b"".join(call.kwargs["data"] for call in request.call_args_list) == path.read_bytes()
+
+
+def test_gsp_upload_file_split_rejects_blank_nodes(tmp_path):
+    path = tmp_path / "data.nt"
+    path.write_bytes(
+        b'<http://localhost/s> <http://localhost/p> "_:not a blank node" .\n'
+        b"<http://localhost/s> <http://localhost/p> _:b0 .\n"
+        b'_:b0 <http://localhost/p> "o" .\n'
+    )
+    client = GraphStoreClient()
+    with mock.patch.object(client.session, "request") as request:
+        with pytest.raises(ValueError, match="blank nodes"):
+            tasks.sparql_gsp_upload_file.fn(
+                str(path), "http://localhost/store", max_bytes=10, client=client
+            )
+
+    request.assert_not_called()
+
+
+def test_gsp_post_stream_gzip():
+    client = GraphStoreClient(gzip=True)
+    with mock.patch.object(client.stream_session, "request") as request:
+        request.return_value.status_code = 204
+        tasks.sparql_gsp_post.fn(
+            (tasks.to_ntriples(t) for t in TRIPLES), "http://localhost/store", client=client
+        )
+        body = b"".join(request.call_args.kwargs["data"])
+
+    assert gzip.decompress(body).decode() == "".join(tasks.to_ntriples(t) for t in TRIPLES)
+
+
+def test_gsp_get_to_file(tmp_path, logger):
+    body = "".join(tasks.to_ntriples(t) for t in TRIPLES).encode()
+    client = GraphStoreClient()
+    with mock.patch.object(client.session, "request") as request:
+        response = request.return_value.__enter__.return_value
+        request.return_value.status_code = 204
+        response.iter_content.return_value = [body[:10], body[10:]]
+        path = tasks.sparql_gsp_get.fn(
+            "http://localhost/store", client=client, path=str(tmp_path / "graph.nt")
+        )
+
+    assert request.call_args.kwargs["stream"]
+    assert (tmp_path / "graph.nt").read_bytes() == body
+    logger.info.assert_called_with("Wrote %d bytes in %d lines to %s.", len(body), 5, path)
+
+
+SELECT_RESULTS = {
+    "head": {"vars": ["s", "n", "label", "created", "day"]},
+    "results": {
+        "bindings": [
+            {
+                "s": {"type": "uri", "value": "http://localhost/0"},
+                "n": {"type": "literal", "datatype": f"{XSD}integer", "value": "1"},
+                "label": {"type": "literal", "xml:lang": "nl", "value": "nul"},
+                "created": {"type": "literal", "datatype": f"{XSD}dateTime", "value": "2022-01-01T10:00:00Z"},
+                "day": {"type": "literal", "datatype": f"{XSD}date", "value": "2022-01-01Z"},
+            },
+            {
+                "s": {"type": "uri", "value": "http://localhost/1"},
+                "created": {"type": "literal", "datatype": f"{XSD}dateTime", "value": "2022-01-02T10:00:00.5Z"},
+            },
+        ]
+    },
+}
+
+
+def mock_select(body: bytes):
+    sparql = mock.MagicMock(method="POST")
+    sparql.query.return_value.response = io.BytesIO(body)
+    return mock.patch.object(tasks, "create_sparqlwrapper", return_value=sparql)
+
+
+def test_sparql_select_json():
+    with mock_select(json.dumps(SELECT_RESULTS).encode()):
+        df = tasks.sparql_select.fn("SELECT * {}", "http://localhost/sparql", chunk_size=1)
+
+    assert list(df.columns) == ["s", "n", "label", "created", "day"]
+    assert str(df["s"].dtype) == "category"
+    assert str(df["n"].dtype) == "Int64"
+    assert df["n"].isna().tolist() == [False, True]
+    assert df["label"][0] == "nul"
+    assert str(df["created"].dtype) == "datetime64[ns, UTC]"
+    assert df["created"][1].isoformat() == "2022-01-02T10:00:00.500000+00:00"
+    assert str(df["day"].dtype) == "datetime64[ns]"
+
+
+def test_to_dataframe_keeps_large_integers():
+    df = to_dataframe(["n"], [[{"n": 99999999999999999999}, {}]], {"n": {INTEGER}})
+
+    assert df["n"][0] == 99999999999999999999
+    assert df["n"].dtype == object
+
+
+def test_sparql_select_batches_tsv():
+    body = (
+        b'?s\t?n\t?label\n'
+        b'<http://localhost/0>\t1\t"tab\\tseparated"\n'
+        b'_:b0\t"2.5"^^<http://www.w3.org/2001/XMLSchema#decimal>\t\n'
+    )
+    with mock_select(body):
+        batches = list(
+            tasks.sparql_select_batches(
+                "SELECT * {}", "http://localhost/sparql", result_format="tsv", batch_size=1
+            )
+        )
+
+    assert batches == [
+        [{"s": "http://localhost/0", "n": 1, "label": "tab\tseparated"}],
+        [{"s": "b0", "n": 2.5}],
+    ]
+
+
+def test_transform_chain_in_store(tmp_path):
+    store = RDFStore(path=str(tmp_path / "store"))
+    source = tasks.dict_to_rdf.fn(
+        {"id": "1", "items": [{"id": "2"}]}, store=store.with_graph("urn:source")
+    )
+    query = f"CONSTRUCT {{ ?s <urn:id> ?id }} WHERE {{ ?s <{tasks.SRC_NS}id> ?id }}"
+    result = tasks.sparql_transform.fn(source, query, output=store.with_graph("urn:result"))
+
+    assert result.graph == "urn:result"
+    assert source.count() == 3
+    assert result.count() == 2
+    assert RDFStore(path=store.path).open() is store.open()
+    assert len(Graph().parse(data=tasks.sparql_transform.fn(result, "CONSTRUCT WHERE { ?s ?p ?o }"))) == 2
+    close_stores()
+
+
+NTRIPLES = "".join(tasks.to_ntriples(t) for t in TRIPLES)
+
+
+def test_store_graph_requires_supported_oxrdflib():
+    store = RDFStore(name="oxrdflib-version")
+    with mock.patch("prefect_meemoo.rdf.store.version", return_value="0.4.0"):
+        with pytest.raises(RuntimeError, match="requires oxrdflib 0.3"):
+            store.get_graph()
+
+
+def test_sparql_transform_ntriples():
+    query = "CONSTRUCT { ?s <urn:p> ?o } WHERE { ?s ?p ?o }"
+    result = tasks.sparql_transform.fn(NTRIPLES, query)
+
+    g = Graph().parse(data=result, format="nt")
+    assert len(g) == 5
+    assert set(g.predicates()) == {URIRef("urn:p")}
+
+
+def test_sparql_transform_insert():
+    query = "INSERT { GRAPH <urn:g> { ?s <urn:p> ?o } } WHERE { ?s ?p ?o }"
+    result = tasks.sparql_transform_insert(NTRIPLES, query, "urn:g")
+
+    assert len(Graph().parse(data=result, format="nt")) == 5
+
+
+def test_sparql_transform_queries_to_file(tmp_path):
+    queries = [
+        "CONSTRUCT { ?s <urn:a> ?o } WHERE { ?s ?p ?o }",
+        "CONSTRUCT { ?s <urn:b> ?o } WHERE { ?s ?p ?o }",
+    ]
+    destination = str(tmp_path / "result.nt")
+    assert tasks.sparql_transform.fn(NTRIPLES, queries, destination=destination) == destination
+
+    g = Graph().parse(destination, format="nt")
+    assert len(g) == 10
+    assert set(g.predicates()) == {URIRef("urn:a"), URIRef("urn:b")}
+
+
+def test_sparql_transform_invalid_query_writes_nothing(tmp_path):
+    queries = ["CONSTRUCT { ?s <urn:a> ?o } WHERE { ?s ?p ?o }", "CONSTRUCT {"]
+    destination = tmp_path / "result.nt"
+
+    with pytest.raises(SyntaxError):
+        tasks.sparql_transform.fn(NTRIPLES, queries, destination=str(destination))
+
+    assert not destination.exists()
+
+
+def test_resolve_query_cache(tmp_path):
+    tasks.query_cache.clear()
+    path = tmp_path / "query.sparql"
+    path.write_text("CONSTRUCT WHERE { ?s ?p ?o }")
+
+    assert tasks.resolve_query(str(path)) == "CONSTRUCT WHERE { ?s ?p ?o }"
+    assert tasks.resolve_query(str(path)) == "CONSTRUCT WHERE { ?s ?p ?o }"
+    assert tasks.resolve_query("ASK {}") == "ASK {}"
+    assert tasks.resolve_query("ASK {}") == "ASK {}"
+    assert (tasks.query_cache.hits, tasks.query_cache.misses) == (2, 2)
+
+    path.write_text("CONSTRUCT WHERE { ?s <urn:p> ?o }")
+    os.utime(path, ns=(0, 0))
+    assert tasks.resolve_query(str(path)) == "CONSTRUCT WHERE { ?s <urn:p> ?o }"
+
+    # Multi-line query text is never looked up on the file system
+    with mock.patch.object(tasks, "_stat_file") as stat_file:
+        assert tasks.resolve_query("ASK {\n}") == "ASK {\n}"
+    stat_file.assert_not_called()
+
+
+def test_sparql_transform_logs_query_cache(logger):
+    tasks.query_cache.clear()
+    tasks.sparql_transform.fn(NTRIPLES, "CONSTRUCT WHERE { ?s ?p ?o }")
+
+    logger.debug.assert_called_with("Query cache: %d hits, %d misses", 0, 1)
+
+
+def test_resolve_text_modes(tmp_path):
+    tasks.file_cache.clear()
+    path = tmp_path / "data.nt"
+    path.write_text(NTRIPLES)
+
+    with mock.patch.object(tasks.os, "stat", wraps=os.stat) as stat:
+        assert tasks.resolve_text(NTRIPLES) == NTRIPLES
+        assert tasks.resolve_text(str(path), "text") == str(path)
+        stat.assert_not_called()
+
+    assert tasks.resolve_text(str(path)) == NTRIPLES
+    assert tasks.resolve_text(str(path), "path") == NTRIPLES
+    assert tasks.file_cache.hits == 1
+    assert tasks.resolve_text("ASK {}") == "ASK {}"
+    with pytest.raises(FileNotFoundError):
+        tasks.resolve_text(str(tmp_path / "missing.nt"), "path")
+
+
+def test_dict_to_rdf_ntriples(tmp_path):
+    record = {"id": 'a "quoted"\nvalue', "tags": ["x", "x"], "nested": {"n": 1.5}}
+    expected = Graph()
+    for t in parse_dict(record, namespace=Namespace(tasks.SRC_NS)):
+        expected.add(t)
+
+    result = Graph().parse(data=tasks.dict_to_rdf.fn(record), format="nt")
+    assert isomorphic(result, expected)
+
+    destination = str(tmp_path / "result.nt")
+    assert tasks.dict_to_rdf.fn(record, destination=destination, dedup=False) == destination
+    with open(destination) as f:
+        assert len(f.readlines()) == 5
+
+
+def test_bulk_json_to_rdf(tmp_path):
+    documents = [json.dumps({"id": i, "item": {"n": i}}) for i in range(5)]
+    documents[2] = {"id": 2, "item": {"n": 2}}
+    destination = str(tmp_path / "result.nt")
+
+    tasks.bulk_json_to_rdf.fn(
+        documents, destination, "https://example.org/id/", id_key="id", shard_size=2, max_workers=2
+    )
+
+    with open(destination) as f:
+        lines = f.readlines()
+    assert len(lines) == 15
+    assert lines[:3] == [
+        f'<https://example.org/id/0/0> <{tasks.SRC_NS}id> "0"^^<http://www.w3.org/2001/XMLSchema#integer> .\n',
+        f"<https://example.org/id/0/0> <{tasks.SRC_NS}item> <https://example.org/id/0/1> .\n",
+        f'<https://example.org/id/0/1> <{tasks.SRC_NS}n> "0"^^<http://www.w3.org/2001/XMLSchema#integer> .\n',
+    ]
+    assert lines[6].startswith("<https://example.org/id/2/0> ")
+    assert lines[-1].startswith("<https://example.org/id/4/1> ")
+    assert os.listdir(tmp_path) == ["result.nt"]
+
+
+def test_bulk_json_to_rdf_iris_are_stable(tmp_path):
+    documents = [json.dumps({"id": i}) for i in range(3)]
+
+    def convert(documents, name):
+        destination = str(tmp_path / name)
+        tasks.bulk_json_to_rdf.fn(documents, destination, "https://example.org/id/", max_workers=1)
+        with open(destination) as f:
+            return set(f)
+
+    # Separate runs don't reuse the subjects of other documents
+    assert convert(documents[1:], "b.nt") < convert(documents, "a.nt")
+    assert not convert(documents[:1], "c.nt") & convert(documents[1:2], "d.nt")
+
+
+def test_jsonl_to_rdf(tmp_path, logger):
+    path = tmp_path / "records.jsonl"
+    path.write_text('{"id": "a"}\n{"id": "b", "tags": ["x"]}\n')
+
+    result = tasks.jsonl_to_rdf.fn(str(path), instance_ns="https://example.org/id/", id_key="id")
+
+    assert len(Graph().parse(data=result, format="nt")) == 3
+    assert "<https://example.org/id/b/0>" in result
+    logger.info.assert_called_with("Converted %s to %d triples.", str(path), 3)
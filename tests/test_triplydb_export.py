@@ -0,0 +1,37 @@
+import csv
+
+import pyarrow.parquet as pq
+import pytest
+
+from prefect_meemoo.triplydb.export import write_results
+
+RESULTS = [
+    {"s": "http://localhost/0", "label": "zero"},
+    {"s": "http://localhost/1"},
+    {"s": "http://localhost/2", "label": "two"},
+]
+
+
+def test_write_results_csv(tmp_path):
+    path, count = write_results(iter(RESULTS), str(tmp_path / "results.csv"), batch_size=2)
+
+    assert count == 3
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert rows[1] == {"s": "http://localhost/1", "label": ""}
+
+
+def test_write_results_parquet(tmp_path):
+    path, count = write_results(iter(RESULTS), str(tmp_path / "results.parquet"), batch_size=2)
+
+    assert count == 3
+    table = pq.read_table(path)
+    assert table.num_rows == 3
+    assert pq.ParquetFile(path).num_row_groups == 2
+    assert table.column("label").to_pylist() == ["zero", None, "two"]
+
+
+def test_write_results_unknown_column(tmp_path):
+    results = iter(RESULTS + [{"s": "http://localhost/3", "other": "x"}])
+    with pytest.raises(ValueError):
+        write_results(results, str(tmp_path / "results.parquet"), batch_size=3)
@@ -0,0 +1,325 @@
+import json
+import re
+import time
+from itertools import islice
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from prefect_meemoo.triplydb import pagination
+from prefect_meemoo.triplydb.pagination import (
+    AdaptivePageSize,
+    SparqlPartitioning,
+    iter_saved_query,
+    iter_sparql_select,
+    run_sparql_select,
+)
+
+PAGE_SIZE = 3
+
+
+class MockResponse:
+    def __init__(self, json_data, status_code=200):
+        self.json_data = json_data
+        self.status_code = status_code
+        self.reason = "OK"
+        self.text = json.dumps(json_data)
+        self.content = self.text.encode()
+
+    def iter_content(self, chunk_size=1):
+        # Use tiny chunks to exercise the incremental parser
+        for i in range(0, len(self.content), 7):
+            yield self.content[i : i + 7]
+
+    def close(self):
+        pass
+
+
+def mocked_pages(n_results):
+    """Returns a request function serving `n_results` rows and the list of requested pages."""
+    rows = [{"s": f"http://localhost/{i}"} for i in range(n_results)]
+    requested = []
+
+    def send(endpoint, *args, **kwargs):
+        params = parse_qs(urlparse(endpoint).query)
+        page, page_size = int(params["page"][0]) - 1, int(params["pageSize"][0])
+        requested.append(page)
+        return MockResponse(rows[page * page_size : (page + 1) * page_size])
+
+    return send, requested
+
+
+@pytest.fixture
+def session():
+    credentials = mock.MagicMock()
+    credentials.token.get_secret_value.return_value = "token"
+    with mock.patch.object(pagination, "PAGE_SIZE", PAGE_SIZE), mock.patch(
+        "prefect_meemoo.triplydb.pagination.TriplyDBCredentials.load_cached",
+        return_value=credentials,
+    ):
+        yield credentials.get_session.return_value
+
+
+def test_iter_saved_query_is_lazy(session):
+    send, requested = mocked_pages(8)
+    session.get.side_effect = send
+    results = iter_saved_query("http://test/run", "triplydb")
+    assert requested == []
+
+    assert next(results) == {"s": "http://localhost/0"}
+    assert requested == [0]
+
+    # Consuming the rest of page 0 does not trigger a request for page 1
+    next(results), next(results)
+    assert requested == [0]
+
+    rest = list(results)
+    assert len(rest) == 5
+    assert requested == [0, 1, 2]
+
+
+def test_iter_saved_query_limit_offset(session):
+    send, requested = mocked_pages(100)
+    session.get.side_effect = send
+    results = list(iter_saved_query("http://test/run", "triplydb", limit=2, offset=4))
+
+    assert results == [{"s": "http://localhost/4"}, {"s": "http://localhost/5"}]
+    assert requested == [1]
+
+
+def test_iter_saved_query_duplicate_page(session):
+    requested = []
+
+    def send(endpoint, *args, **kwargs):
+        requested.append(endpoint)
+        return MockResponse([{"s": "http://localhost/0"}] * PAGE_SIZE)
+
+    session.get.side_effect = send
+    results = list(iter_saved_query("http://test/run", "triplydb"))
+
+    assert len(results) == PAGE_SIZE
+    assert len(requested) == 2
+
+
+def test_iter_sparql_select_rejects_limit(session):
+    with pytest.raises(Exception):
+        iter_sparql_select("http://test/sparql", "SELECT * WHERE {?s ?p ?o} LIMIT 5", "triplydb")
+
+
+def test_iter_saved_query_prefetch(session):
+    send, requested = mocked_pages(10)
+
+    def slow_send(endpoint, *args, **kwargs):
+        # Let later pages arrive first to check the result order
+        page = int(endpoint.split("page=")[1].split("&")[0])
+        time.sleep(0.05 / page)
+        return send(endpoint, *args, **kwargs)
+
+    session.get.side_effect = slow_send
+    results = list(iter_saved_query("http://test/run", "triplydb", prefetch=3))
+
+    assert results == [{"s": f"http://localhost/{i}"} for i in range(10)]
+    assert set(range(4)) <= set(requested)
+
+
+def test_iter_saved_query_prefetch_closes_unread_pages(session):
+    send, requested = mocked_pages(30)
+    responses = []
+
+    def tracked_send(endpoint, *args, **kwargs):
+        response = send(endpoint, *args, **kwargs)
+        response.close = mock.Mock()
+        responses.append(response)
+        return response
+
+    session.get.side_effect = tracked_send
+    results = iter_saved_query("http://test/run", "triplydb", prefetch=3)
+    assert len(list(islice(results, 4))) == 4
+
+    # Let the prefetched pages arrive, then drop the iterator, which closes the generators
+    deadline = time.time() + 5
+    while time.time() < deadline and len(responses) < 4:
+        time.sleep(0.01)
+    assert len(responses) >= 4
+    del results
+
+    assert all(r.close.called for r in responses)
+
+
+def test_iter_saved_query_skips_pages_before_offset(session):
+    send, requested = mocked_pages(10)
+    session.get.side_effect = send
+    results = list(iter_saved_query("http://test/run", "triplydb", limit=2, offset=7))
+
+    assert results == [{"s": "http://localhost/7"}, {"s": "http://localhost/8"}]
+    assert requested == [2]
+
+
+def test_iter_sparql_select_offset_pushdown(session):
+    queries = []
+
+    def send(endpoint, data=None, **kwargs):
+        queries.append(data)
+        return MockResponse([{"s": "http://localhost/0"}])
+
+    session.post.side_effect = send
+    results = list(iter_sparql_select("http://test/sparql", "SELECT * WHERE {?s ?p ?o}", "triplydb", offset=5))
+
+    assert len(results) == 1
+    assert queries == [f"SELECT * WHERE {{?s ?p ?o}}LIMIT {PAGE_SIZE}\nOFFSET 5"]
+
+
+def test_iter_sparql_select_keyset(session):
+    keys = [f"http://localhost/{i}" for i in range(8)]
+    queries = []
+
+    def send(endpoint, data=None, **kwargs):
+        queries.append(data)
+        match = re.search(r'STR\(\?s\) > "(.*)"', data)
+        remaining = [k for k in keys if match is None or k > match.group(1)]
+        return MockResponse([{"s": k} for k in remaining[:PAGE_SIZE]])
+
+    session.post.side_effect = send
+    results = list(iter_sparql_select("http://test/sparql", "SELECT * WHERE {?s ?p ?o}", "triplydb", order_key="s"))
+
+    assert [r["s"] for r in results] == keys
+    assert len(queries) == 3
+    assert all("ORDER BY STR(?s)" in q and "OFFSET" not in q for q in queries)
+    assert 'FILTER(STR(?s) > "http://localhost/5")' in queries[2]
+
+
+def test_credentials_are_loaded_once():
+    from prefect_meemoo.triplydb.credentials import TriplyDBCredentials
+
+    TriplyDBCredentials.clear_cache()
+    credentials = TriplyDBCredentials(host="http://test", token="token")
+    with mock.patch.object(TriplyDBCredentials, "load", return_value=credentials) as load:
+        assert TriplyDBCredentials.load_cached("triplydb") is credentials
+        assert TriplyDBCredentials.load_cached("triplydb") is credentials
+    load.assert_called_once_with("triplydb")
+
+    session = credentials.get_session()
+    assert session is TriplyDBCredentials.load_cached("triplydb").get_session()
+    assert 429 in session.get_adapter("https://test").max_retries.status_forcelist
+    TriplyDBCredentials.clear_cache()
+
+
+def test_iter_json_items():
+    chunks = [b'[{"s": "a", "n": 1.', b'5}, {"s"', b': "b"}', b"]"]
+    assert list(pagination._iter_json_items(chunks)) == [{"s": "a", "n": 1.5}, {"s": "b"}]
+
+
+def test_iter_sparql_select_adaptive_page_size(session):
+    rows = [{"s": f"http://localhost/{i}"} for i in range(40)]
+    limits = []
+
+    def send(endpoint, data=None, **kwargs):
+        limit, offset = map(int, re.search(r"LIMIT (\d+)\nOFFSET (\d+)", data).groups())
+        limits.append(limit)
+        return MockResponse(rows[offset : offset + limit])
+
+    session.post.side_effect = send
+    adaptive = AdaptivePageSize(min_size=1, max_size=12, target_duration=60)
+    results = list(iter_sparql_select("http://test/sparql", "SELECT * WHERE {?s ?p ?o}", "triplydb", adaptive_page_size=adaptive))
+
+    assert results == rows
+    assert limits == [3, 6, 12, 12, 12]
+
+
+def test_iter_saved_query_adaptive_page_size_is_aligned(session):
+    send, requested = mocked_pages(20)
+    pages = []
+
+    def record(endpoint, *args, **kwargs):
+        params = parse_qs(urlparse(endpoint).query)
+        pages.append((int(params["page"][0]), int(params["pageSize"][0])))
+        return send(endpoint, *args, **kwargs)
+
+    session.get.side_effect = record
+    adaptive = AdaptivePageSize(min_size=1, max_size=12, target_duration=60)
+    results = list(iter_saved_query("http://test/run", "triplydb", adaptive_page_size=adaptive))
+
+    assert len(results) == 20
+    assert pages == [(1, 3), (2, 3), (2, 6), (2, 12)]
+
+
+def test_aligned_page_size_shrinks_within_bounds():
+    sizer = pagination._PageSizer(
+        AdaptivePageSize(min_size=1_000, max_size=100_000, target_duration=5), aligned=True
+    )
+    offset = 0
+    sizes = []
+    for i in range(20):
+        size = sizer.next_size(offset)
+        assert offset % size == 0
+        sizes.append(size)
+        # Four fast pages, then slow ones
+        sizer.observe(0.1 if i < 4 else 60, 0, size)
+        offset += size
+
+    assert min(sizes) == 1_000
+    assert sizes[:9] == [10_000, 10_000, 20_000, 40_000, 80_000, 40_000, 20_000, 10_000, 5_000]
+    assert sizes[-5:] == [1_000] * 5
+
+
+def test_run_sparql_select_partitioned(session):
+    graphs = ["<http://localhost/g/1>", "<http://localhost/g/2>"]
+
+    def send(endpoint, data=None, **kwargs):
+        graph = re.search(r"VALUES \?g \{ <(.*)> \}", data).group(1)
+        offset = int(re.search(r"OFFSET (\d+)", data).group(1))
+        rows = [{"g": graph, "s": f"{graph}/{i}"} for i in range(5)]
+        return MockResponse(rows[offset : offset + PAGE_SIZE])
+
+    session.post.side_effect = send
+    partitioning = SparqlPartitioning(variable="g", values=graphs)
+    results = run_sparql_select("http://test/sparql", "SELECT * WHERE { GRAPH ?g {?s ?p ?o} }", "triplydb", limit=8, offset=1, partitioning=partitioning)
+
+    expected = [f"http://localhost/g/{g}/{i}" for g in (1, 2) for i in range(5)]
+    assert [r["s"] for r in results] == expected[1:9]
+
+
+def test_iter_saved_query_resume_from_checkpoint(session, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    send, requested = mocked_pages(10)
+
+    def failing_send(endpoint, *args, **kwargs):
+        if "page=3&" in endpoint:
+            raise ConnectionError("Transient failure")
+        return send(endpoint, *args, **kwargs)
+
+    session.get.side_effect = failing_send
+    results = []
+    with pytest.raises(ConnectionError):
+        for r in iter_saved_query("http://test/run", "triplydb", offset=1, checkpoint=checkpoint):
+            results.append(r)
+    assert len(results) == 5
+
+    requested.clear()
+    session.get.side_effect = send
+    results += list(iter_saved_query("http://test/run", "triplydb", offset=1, checkpoint=checkpoint, resume=True))
+
+    assert results == [{"s": f"http://localhost/{i}"} for i in range(1, 10)]
+    assert requested == [2, 3]
+    assert json.load(open(checkpoint))["completed"]
+
+
+def test_iter_sparql_select_keyset_resume_from_checkpoint(session, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    keys = [f"http://localhost/{i}" for i in range(8)]
+    queries = []
+
+    def send(endpoint, data=None, **kwargs):
+        queries.append(data)
+        match = re.search(r'STR\(\?s\) > "(.*)"', data)
+        remaining = [k for k in keys if match is None or k > match.group(1)]
+        return MockResponse([{"s": k} for k in remaining[:PAGE_SIZE]])
+
+    session.post.side_effect = send
+    sparql = "SELECT * WHERE {?s ?p ?o}"
+    first = list(islice(iter_sparql_select("http://test/sparql", sparql, "triplydb", order_key="s", checkpoint=checkpoint), 4))
+    rest = list(iter_sparql_select("http://test/sparql", sparql, "triplydb", limit=6, order_key="s", checkpoint=checkpoint, resume=True))
+
+    # The partially consumed second page is fetched again
+    assert [r["s"] for r in first + rest] == keys[:4] + keys[3:6]